@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -24,9 +26,10 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    user = await db.scalar(select(User).where(User.username == username))
+    # bcrypt занимает процессор: проверка пароля идет в пуле потоков, а не в event loop
+    if not user or not await run_in_threadpool(verify_password, password, user.password_hash):
         return None
     return user
 
@@ -42,7 +45,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -56,7 +59,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = await db.scalar(select(User).where(User.username == token_data.username))
     if user is None:
         raise credentials_exception
     return user
@@ -78,20 +81,20 @@ async def get_current_teacher(current_user: User = Depends(get_current_active_us
 
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Проверяем, что пользователь с таким username не существует
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
     # Проверяем email, если он указан
     if user.email:
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = await db.scalar(select(User).where(User.email == user.email))
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
     
     # Создаем нового пользователя
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -100,17 +103,17 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         student_id=user.student_id
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -125,5 +128,5 @@ def login_for_access_token(
 
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user 
\ No newline at end of file
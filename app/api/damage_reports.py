@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
+import json
 import os
 import uuid
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.config import settings
 from app.models.user import User
 from app.models.textbook import Textbook
@@ -14,6 +16,9 @@ from app.schemas.damage_report import DamageReportCreate, DamageReportUpdate, Da
 from app.api.auth import get_current_teacher
 from app.services.image_storage import ImageStorage
 from app.services.parent_notifications import ParentNotificationService
+from app.services.report_statistics import ReportStatistics
+from app.services.report_cache import report_cache
+from app.services.pagination import KeysetPage, set_next_cursor
 
 router = APIRouter()
 
@@ -45,12 +50,12 @@ async def create_damage_report(
     damage_type: DamageType = Form(...),
     description: str = Form(..., min_length=10, max_length=1000),
     photos: List[UploadFile] = File([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Создание отчета о повреждении учебника"""
     # Проверяем существование учебника
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
@@ -63,14 +68,15 @@ async def create_damage_report(
         reported_by=current_user.id,
         damage_type=damage_type,
         description=description,
-        photos=photo_paths,
+        photos=json.dumps(photo_paths),
         status=DamageStatus.PENDING,
         reported_at=datetime.utcnow()
     )
     
     db.add(damage_report)
-    db.commit()
-    db.refresh(damage_report)
+    await db.commit()
+    report_cache.invalidate()
+    await db.refresh(damage_report)
     
     # Уведомляем родителей об утере
     if damage_type == DamageType.LOST:
@@ -82,16 +88,18 @@ async def create_damage_report(
 
 @router.get("/", response_model=List[DamageReportResponse])
 async def get_damage_reports(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     textbook_id: Optional[int] = None,
     damage_type: Optional[DamageType] = None,
     status: Optional[DamageStatus] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение списка отчетов о повреждениях с фильтрацией"""
-    query = db.query(DamageReport)
+    query = select(DamageReport)
     
     if textbook_id:
         query = query.filter(DamageReport.textbook_id == textbook_id)
@@ -102,18 +110,19 @@ async def get_damage_reports(
     if status:
         query = query.filter(DamageReport.status == status)
     
-    damage_reports = query.offset(skip).limit(limit).all()
+    damage_reports, next_cursor = await KeysetPage(db, DamageReport).fetch(query, cursor, skip, limit)
+    set_next_cursor(response, next_cursor)
     return damage_reports
 
 
 @router.get("/{damage_report_id}", response_model=DamageReportResponse)
 async def get_damage_report(
     damage_report_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение конкретного отчета о повреждении"""
-    damage_report = db.query(DamageReport).filter(DamageReport.id == damage_report_id).first()
+    damage_report = await db.get(DamageReport, damage_report_id)
     if not damage_report:
         raise HTTPException(status_code=404, detail="Damage report not found")
     return damage_report
@@ -123,11 +132,11 @@ async def get_damage_report(
 async def update_damage_report(
     damage_report_id: int,
     damage_report_update: DamageReportUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Обновление отчета о повреждении"""
-    db_damage_report = db.query(DamageReport).filter(DamageReport.id == damage_report_id).first()
+    db_damage_report = await db.get(DamageReport, damage_report_id)
     if not db_damage_report:
         raise HTTPException(status_code=404, detail="Damage report not found")
     
@@ -140,37 +149,38 @@ async def update_damage_report(
     if db_damage_report.status == DamageStatus.CHECKED:
         db_damage_report.checked_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(db_damage_report)
+    await db.commit()
+    report_cache.invalidate()
+    await db.refresh(db_damage_report)
     return db_damage_report
 
 
 @router.get("/textbook/{textbook_id}/history", response_model=List[DamageReportResponse])
 async def get_textbook_damage_history(
     textbook_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение истории повреждений конкретного учебника"""
-    damage_reports = db.query(DamageReport).filter(
+    damage_reports = (await db.scalars(select(DamageReport).where(
         DamageReport.textbook_id == textbook_id
-    ).order_by(DamageReport.reported_at.desc()).all()
+    ).order_by(DamageReport.reported_at.desc()))).all()
     return damage_reports
 
 
 @router.get("/pending-check", response_model=List[DamageReportResponse])
 async def get_pending_damage_reports(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение отчетов о повреждениях, ожидающих проверки"""
     # Находим отчеты, которые были созданы более 7 дней назад и еще не проверены
     check_deadline = datetime.utcnow() - timedelta(days=settings.DAMAGE_CHECK_DAYS)
     
-    pending_reports = db.query(DamageReport).filter(
+    pending_reports = (await db.scalars(select(DamageReport).where(
         DamageReport.status == DamageStatus.PENDING,
         DamageReport.reported_at <= check_deadline
-    ).all()
+    ))).all()
     
     return pending_reports
 
@@ -179,11 +189,11 @@ async def get_pending_damage_reports(
 async def check_damage_report(
     damage_report_id: int,
     decision: str = Form(..., min_length=1, max_length=500),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Проверка отчета о повреждении"""
-    damage_report = db.query(DamageReport).filter(DamageReport.id == damage_report_id).first()
+    damage_report = await db.get(DamageReport, damage_report_id)
     if not damage_report:
         raise HTTPException(status_code=404, detail="Damage report not found")
     
@@ -196,28 +206,26 @@ async def check_damage_report(
     damage_report.checked_by = current_user.id
     damage_report.checked_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(damage_report)
+    await db.commit()
+    report_cache.invalidate()
+    await db.refresh(damage_report)
     
     return damage_report
 
 
 @router.get("/statistics/summary")
 async def get_damage_statistics(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение статистики по повреждениям"""
-    total_reports = db.query(DamageReport).count()
-    pending_reports = db.query(DamageReport).filter(DamageReport.status == DamageStatus.PENDING).count()
-    checked_reports = db.query(DamageReport).filter(DamageReport.status == DamageStatus.CHECKED).count()
-    
-    # Статистика по типам повреждений
-    damage_type_stats = db.query(DamageReport.damage_type, db.func.count(DamageReport.id)).group_by(DamageReport.damage_type).all()
+    stats = await ReportStatistics(db).damage_statistics()
     
     return {
-        "total_reports": total_reports,
-        "pending_reports": pending_reports,
-        "checked_reports": checked_reports,
-        "damage_type_statistics": dict(damage_type_stats)
+        "total_reports": stats["total"],
+        "pending_reports": stats["by_status"].get(DamageStatus.PENDING.value, 0),
+        "checked_reports": stats["by_status"].get(DamageStatus.CHECKED.value, 0),
+        "damage_type_statistics": stats["by_type"],
+        "grade_statistics": stats["by_grade"],
+        "subject_statistics": stats["by_subject"]
     } 
\ No newline at end of file
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
+import json
 import os
 import uuid
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User
 from app.models.textbook import Textbook
 from app.models.found_report import FoundReport, FoundStatus
@@ -13,6 +15,9 @@ from app.schemas.found_report import FoundReportCreate, FoundReportUpdate, Found
 from app.api.auth import get_current_teacher
 from app.services.image_storage import ImageStorage
 from app.services.parent_notifications import ParentNotificationService
+from app.services.report_statistics import ReportStatistics
+from app.services.report_cache import report_cache
+from app.services.pagination import KeysetPage, set_next_cursor
 
 router = APIRouter()
 
@@ -44,12 +49,12 @@ async def create_found_report(
     found_location: str = Form(..., min_length=5, max_length=200),
     description: Optional[str] = Form(None, max_length=500),
     photos: List[UploadFile] = File([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Создание отчета о найденном учебнике"""
     # Проверяем существование учебника
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
@@ -62,14 +67,15 @@ async def create_found_report(
         reported_by=current_user.id,
         found_location=found_location,
         description=description,
-        photos=photo_paths,
+        photos=json.dumps(photo_paths),
         status=FoundStatus.FOUND,
         found_at=datetime.utcnow()
     )
     
     db.add(found_report)
-    db.commit()
-    db.refresh(found_report)
+    await db.commit()
+    report_cache.invalidate()
+    await db.refresh(found_report)
     
     # Уведомляем родителей владельца
     notification_service = ParentNotificationService()
@@ -80,15 +86,17 @@ async def create_found_report(
 
 @router.get("/", response_model=List[FoundReportResponse])
 async def get_found_reports(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     textbook_id: Optional[int] = None,
     status: Optional[FoundStatus] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение списка отчетов о находках с фильтрацией"""
-    query = db.query(FoundReport)
+    query = select(FoundReport)
     
     if textbook_id:
         query = query.filter(FoundReport.textbook_id == textbook_id)
@@ -96,18 +104,19 @@ async def get_found_reports(
     if status:
         query = query.filter(FoundReport.status == status)
     
-    found_reports = query.offset(skip).limit(limit).all()
+    found_reports, next_cursor = await KeysetPage(db, FoundReport).fetch(query, cursor, skip, limit)
+    set_next_cursor(response, next_cursor)
     return found_reports
 
 
 @router.get("/{found_report_id}", response_model=FoundReportResponse)
 async def get_found_report(
     found_report_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение конкретного отчета о находке"""
-    found_report = db.query(FoundReport).filter(FoundReport.id == found_report_id).first()
+    found_report = await db.get(FoundReport, found_report_id)
     if not found_report:
         raise HTTPException(status_code=404, detail="Found report not found")
     return found_report
@@ -117,11 +126,11 @@ async def get_found_report(
 async def update_found_report(
     found_report_id: int,
     found_report_update: FoundReportUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Обновление отчета о находке"""
-    db_found_report = db.query(FoundReport).filter(FoundReport.id == found_report_id).first()
+    db_found_report = await db.get(FoundReport, found_report_id)
     if not db_found_report:
         raise HTTPException(status_code=404, detail="Found report not found")
     
@@ -134,8 +143,9 @@ async def update_found_report(
     if db_found_report.status == FoundStatus.RETURNED:
         db_found_report.returned_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(db_found_report)
+    await db.commit()
+    report_cache.invalidate()
+    await db.refresh(db_found_report)
     return db_found_report
 
 
@@ -143,11 +153,11 @@ async def update_found_report(
 async def mark_as_returned(
     found_report_id: int,
     notes: Optional[str] = Form(None, max_length=500),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Отметить найденный учебник как возвращенный"""
-    found_report = db.query(FoundReport).filter(FoundReport.id == found_report_id).first()
+    found_report = await db.get(FoundReport, found_report_id)
     if not found_report:
         raise HTTPException(status_code=404, detail="Found report not found")
     
@@ -161,8 +171,9 @@ async def mark_as_returned(
     if notes:
         found_report.notes = notes
     
-    db.commit()
-    db.refresh(found_report)
+    await db.commit()
+    report_cache.invalidate()
+    await db.refresh(found_report)
     
     return found_report
 
@@ -170,41 +181,44 @@ async def mark_as_returned(
 @router.get("/textbook/{textbook_id}/history", response_model=List[FoundReportResponse])
 async def get_textbook_found_history(
     textbook_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение истории находок конкретного учебника"""
-    found_reports = db.query(FoundReport).filter(
+    found_reports = (await db.scalars(select(FoundReport).where(
         FoundReport.textbook_id == textbook_id
-    ).order_by(FoundReport.found_at.desc()).all()
+    ).order_by(FoundReport.found_at.desc()))).all()
     return found_reports
 
 
 @router.get("/active", response_model=List[FoundReportResponse])
 async def get_active_found_reports(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение активных отчетов о находках (найдены, но не возвращены)"""
-    active_reports = db.query(FoundReport).filter(
+    active_reports = (await db.scalars(select(FoundReport).where(
         FoundReport.status == FoundStatus.FOUND
-    ).all()
+    ))).all()
     return active_reports
 
 
 @router.get("/statistics/summary")
 async def get_found_statistics(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение статистики по находкам"""
-    total_reports = db.query(FoundReport).count()
-    found_reports = db.query(FoundReport).filter(FoundReport.status == FoundStatus.FOUND).count()
-    returned_reports = db.query(FoundReport).filter(FoundReport.status == FoundStatus.RETURNED).count()
+    stats = await ReportStatistics(db).found_statistics()
+    total_reports = stats["total"]
+    found_reports = stats["by_status"].get(FoundStatus.FOUND.value, 0)
+    returned_reports = stats["by_status"].get(FoundStatus.RETURNED.value, 0)
     
     return {
         "total_reports": total_reports,
         "found_reports": found_reports,
         "returned_reports": returned_reports,
-        "return_rate": (returned_reports / total_reports * 100) if total_reports > 0 else 0
-    } 
\ No newline at end of file
+        "return_rate": (returned_reports / total_reports * 100) if total_reports > 0 else 0,
+        "grade_statistics": stats["by_grade"],
+        "subject_statistics": stats["by_subject"]
+    }
\ No newline at end of file
@@ -1,57 +1,94 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, distinct, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from typing import List, Optional
 from datetime import datetime, timedelta
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.config import settings
 from app.models.user import User, UserRole
 from app.models.student import Student
 from app.models.textbook import Textbook
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.models.damage_report import DamageReport, DamageType, DamageStatus
+from app.models.active_loan import ActiveLoan
 from app.api.auth import get_current_teacher
 from app.services.parent_notifications import ParentNotificationService
+from app.services.report_statistics import ReportStatistics
+from app.services.textbook_timeline import TextbookTimeline
+from app.services.report_cache import cached_report, report_cache
+from app.services.export import ExportFormat, export_response, stream_rows, stream_scalars
 
 router = APIRouter()
 
 
 @router.get("/issue-summary")
+@cached_report("issue-summary")
 async def get_issue_summary(
     grade: Optional[str] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Отчет по выданным учебникам"""
-    # Базовый запрос для активных транзакций выдачи
-    query = db.query(Transaction).filter(
+    # Выдачи вместе с учеником, учебником и закрывающим возвратом (если есть)
+    ReturnTransaction = aliased(Transaction)
+    query = select(Transaction).join(
+        Student, Student.id == Transaction.student_id
+    ).join(
+        Textbook, Textbook.id == Transaction.textbook_id
+    ).outerjoin(
+        ReturnTransaction,
+        and_(
+            ReturnTransaction.issue_transaction_id == Transaction.id,
+            ReturnTransaction.status == TransactionStatus.COMPLETED
+        )
+    ).where(
         Transaction.transaction_type == TransactionType.ISSUE,
         Transaction.status == TransactionStatus.COMPLETED
     )
     
     if grade:
-        # Фильтруем по классу
-        students_in_grade = db.query(Student.id).filter(Student.grade == grade).subquery()
-        query = query.filter(Transaction.student_id.in_(students_in_grade))
-    
-    issued_transactions = query.all()
+        query = query.filter(Student.grade == grade)
+    
+    rows_query = query.with_only_columns(
+        Student,
+        Textbook.id,
+        Textbook.qr_code,
+        Textbook.subject,
+        Textbook.title,
+        Transaction.issued_at,
+        ReturnTransaction.issued_at,
+        maintain_column_froms=True
+    ).order_by(Transaction.id)
+    
+    if export_format:
+        return export_response(
+            "issue-summary",
+            ["student_id", "full_name", "grade", "textbook_id", "qr_code", "subject", "title",
+             "issued_at", "returned_at"],
+            (
+                (student.id, student.full_name, student.grade, *textbook_row)
+                async for student, *textbook_row in stream_rows(db, rows_query)
+            ),
+            export_format
+        )
+    
+    # Итоговая статистика считается агрегатами в БД
+    total_students, total_issued, total_returned = (await db.execute(query.with_only_columns(
+        func.count(distinct(Transaction.student_id)),
+        func.count(Transaction.id),
+        func.count(ReturnTransaction.id),
+        maintain_column_froms=True
+    ))).one()
+    
+    rows = (await db.execute(rows_query)).all()
     
     # Группируем по ученикам
     students_summary = {}
     
-    for transaction in issued_transactions:
-        student = db.query(Student).filter(Student.id == transaction.student_id).first()
-        textbook = db.query(Textbook).filter(Textbook.id == transaction.textbook_id).first()
-        
-        if not student or not textbook:
-            continue
-        
-        # Проверяем, есть ли возврат
-        return_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == transaction.textbook_id,
-            Transaction.transaction_type == TransactionType.RETURN,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
-        
+    for student, textbook_id, qr_code, subject, title, issued_at, returned_at in rows:
         if student.id not in students_summary:
             students_summary[student.id] = {
                 "student_id": student.id,
@@ -65,70 +102,79 @@ async def get_issue_summary(
             }
         
         textbook_info = {
-            "textbook_id": textbook.id,
-            "qr_code": textbook.qr_code,
-            "subject": textbook.subject,
-            "title": textbook.title,
-            "issued_at": transaction.issued_at
+            "textbook_id": textbook_id,
+            "qr_code": qr_code,
+            "subject": subject,
+            "title": title,
+            "issued_at": issued_at
         }
         
-        if return_transaction:
-            textbook_info["returned_at"] = return_transaction.issued_at
+        if returned_at:
+            textbook_info["returned_at"] = returned_at
             students_summary[student.id]["returned_textbooks"].append(textbook_info)
         else:
             students_summary[student.id]["not_returned_textbooks"].append(textbook_info)
         
         students_summary[student.id]["issued_textbooks"].append(textbook_info)
     
-    # Формируем итоговую статистику
-    total_students = len(students_summary)
-    total_issued = sum(len(data["issued_textbooks"]) for data in students_summary.values())
-    total_returned = sum(len(data["returned_textbooks"]) for data in students_summary.values())
-    total_not_returned = sum(len(data["not_returned_textbooks"]) for data in students_summary.values())
-    
     return {
         "summary": {
             "total_students": total_students,
             "total_issued": total_issued,
             "total_returned": total_returned,
-            "total_not_returned": total_not_returned
+            "total_not_returned": total_issued - total_returned
         },
         "students": list(students_summary.values())
     }
 
 
 @router.get("/not-issued")
+@cached_report("not-issued")
 async def get_not_issued_report(
     grade: Optional[str] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    """Отчет по ученикам, которые не получили учебники"""
-    # Получаем всех активных учеников
-    students_query = db.query(Student).filter(Student.is_active == True)
+    """Отчет по ученикам, которые не получили учебники (ни одной выдачи за все время)"""
+    # Активные ученики без завершенных выдач (anti-join по ix_transactions_student_type_status).
+    # Ученик, сдавший все учебники, сюда не попадает - он их получал
+    students_query = select(Student).where(
+        Student.is_active == True,
+        ~exists().where(
+            Transaction.student_id == Student.id,
+            Transaction.transaction_type == TransactionType.ISSUE,
+            Transaction.status == TransactionStatus.COMPLETED
+        )
+    )
     if grade:
         students_query = students_query.filter(Student.grade == grade)
     
-    students = students_query.all()
-    
-    not_issued_students = []
-    
-    for student in students:
-        # Проверяем, есть ли у ученика активные транзакции выдачи
-        active_issues = db.query(Transaction).filter(
-            Transaction.student_id == student.id,
-            Transaction.transaction_type == TransactionType.ISSUE,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).all()
-        
-        if not active_issues:
-            not_issued_students.append({
-                "student_id": student.id,
-                "full_name": student.full_name,
-                "grade": student.grade,
-                "phone": student.phone,
-                "parent_phone": student.parent_phone
-            })
+    students_query = students_query.order_by(Student.id)
+    
+    if export_format:
+        return export_response(
+            "not-issued",
+            ["student_id", "full_name", "grade", "phone", "parent_phone"],
+            (
+                (student.id, student.full_name, student.grade, student.phone, student.parent_phone)
+                async for student in stream_scalars(db, students_query)
+            ),
+            export_format
+        )
+    
+    students = (await db.scalars(students_query)).all()
+    
+    not_issued_students = [
+        {
+            "student_id": student.id,
+            "full_name": student.full_name,
+            "grade": student.grade,
+            "phone": student.phone,
+            "parent_phone": student.parent_phone
+        }
+        for student in students
+    ]
     
     return {
         "total_not_issued": len(not_issued_students),
@@ -137,55 +183,61 @@ async def get_not_issued_report(
 
 
 @router.get("/not-returned")
+@cached_report("not-returned")
 async def get_not_returned_report(
     grade: Optional[str] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Отчет по ученикам, которые не сдали учебники"""
-    # Получаем все активные транзакции выдачи
-    issued_transactions = db.query(Transaction).filter(
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).all()
+    # Открытые выдачи - это выдачи без возврата, поэтому читаем их из active_loans
+    query = select(Student, Textbook, ActiveLoan.issued_at).join(
+        ActiveLoan, ActiveLoan.student_id == Student.id
+    ).join(
+        Textbook, Textbook.id == ActiveLoan.textbook_id
+    )
+    
+    if grade:
+        query = query.filter(Student.grade == grade)
+    
+    query = query.order_by(Student.id, ActiveLoan.issued_at)
+    
+    if export_format:
+        return export_response(
+            "not-returned",
+            ["student_id", "full_name", "grade", "phone", "parent_phone",
+             "textbook_id", "qr_code", "subject", "title", "issued_at"],
+            (
+                (student.id, student.full_name, student.grade, student.phone, student.parent_phone,
+                 textbook.id, textbook.qr_code, textbook.subject, textbook.title, issued_at)
+                async for student, textbook, issued_at in stream_rows(db, query)
+            ),
+            export_format
+        )
+    
+    rows = (await db.execute(query)).all()
     
     not_returned_students = {}
     
-    for transaction in issued_transactions:
-        student = db.query(Student).filter(Student.id == transaction.student_id).first()
-        textbook = db.query(Textbook).filter(Textbook.id == transaction.textbook_id).first()
-        
-        if not student or not textbook:
-            continue
-        
-        if grade and student.grade != grade:
-            continue
-        
-        # Проверяем, есть ли возврат
-        return_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == transaction.textbook_id,
-            Transaction.transaction_type == TransactionType.RETURN,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
+    for student, textbook, issued_at in rows:
+        if student.id not in not_returned_students:
+            not_returned_students[student.id] = {
+                "student_id": student.id,
+                "full_name": student.full_name,
+                "grade": student.grade,
+                "phone": student.phone,
+                "parent_phone": student.parent_phone,
+                "not_returned_textbooks": []
+            }
         
-        if not return_transaction:
-            if student.id not in not_returned_students:
-                not_returned_students[student.id] = {
-                    "student_id": student.id,
-                    "full_name": student.full_name,
-                    "grade": student.grade,
-                    "phone": student.phone,
-                    "parent_phone": student.parent_phone,
-                    "not_returned_textbooks": []
-                }
-            
-            not_returned_students[student.id]["not_returned_textbooks"].append({
-                "textbook_id": textbook.id,
-                "qr_code": textbook.qr_code,
-                "subject": textbook.subject,
-                "title": textbook.title,
-                "issued_at": transaction.issued_at
-            })
+        not_returned_students[student.id]["not_returned_textbooks"].append({
+            "textbook_id": textbook.id,
+            "qr_code": textbook.qr_code,
+            "subject": textbook.subject,
+            "title": textbook.title,
+            "issued_at": issued_at
+        })
     
     total_students = len(not_returned_students)
     total_textbooks = sum(len(data["not_returned_textbooks"]) for data in not_returned_students.values())
@@ -200,15 +252,24 @@ async def get_not_returned_report(
 
 
 @router.get("/damage-summary")
+@cached_report("damage-summary", per_grade=False)
 async def get_damage_summary(
     grade: Optional[str] = None,
     damage_type: Optional[DamageType] = None,
     status: Optional[DamageStatus] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Отчет по повреждениям учебников"""
-    query = db.query(DamageReport)
+    # Автор отчета - пользователь, ученик находится через users.student_id
+    query = select(DamageReport, Textbook, Student).join(
+        Textbook, Textbook.id == DamageReport.textbook_id
+    ).join(
+        User, User.id == DamageReport.reported_by
+    ).join(
+        Student, Student.id == User.student_id
+    )
     
     if damage_type:
         query = query.filter(DamageReport.damage_type == damage_type)
@@ -216,20 +277,30 @@ async def get_damage_summary(
     if status:
         query = query.filter(DamageReport.status == status)
     
-    damage_reports = query.all()
+    if grade:
+        query = query.filter(Student.grade == grade)
+    
+    query = query.order_by(Student.id, DamageReport.id)
+    
+    if export_format:
+        return export_response(
+            "damage-summary",
+            ["student_id", "full_name", "grade", "report_id", "textbook_id", "textbook_title",
+             "damage_type", "description", "status", "reported_at", "checked_at"],
+            (
+                (student.id, student.full_name, student.grade, report.id, textbook.id,
+                 f"{textbook.subject}: {textbook.title}", report.damage_type, report.description,
+                 report.status, report.reported_at, report.checked_at)
+                async for report, textbook, student in stream_rows(db, query)
+            ),
+            export_format
+        )
+    
+    rows = (await db.execute(query)).all()
     
     damage_summary = {}
     
-    for report in damage_reports:
-        textbook = db.query(Textbook).filter(Textbook.id == report.textbook_id).first()
-        student = db.query(Student).filter(Student.id == report.reported_by).first()
-        
-        if not textbook or not student:
-            continue
-        
-        if grade and student.grade != grade:
-            continue
-        
+    for report, textbook, student in rows:
         if student.id not in damage_summary:
             damage_summary[student.id] = {
                 "student_id": student.id,
@@ -249,34 +320,45 @@ async def get_damage_summary(
             "checked_at": report.checked_at
         })
     
-    # Статистика по типам повреждений
-    damage_type_stats = {}
-    for report in damage_reports:
-        damage_type = report.damage_type.value
-        if damage_type not in damage_type_stats:
-            damage_type_stats[damage_type] = 0
-        damage_type_stats[damage_type] += 1
-    
-    total_reports = len(damage_reports)
-    pending_reports = len([r for r in damage_reports if r.status == DamageStatus.PENDING])
-    checked_reports = len([r for r in damage_reports if r.status == DamageStatus.CHECKED])
+    # Статистика по всем отчетам с учетом фильтров по типу и статусу
+    stats = await ReportStatistics(db).damage_statistics(damage_type=damage_type, status=status)
     
     return {
         "summary": {
-            "total_reports": total_reports,
-            "pending_reports": pending_reports,
-            "checked_reports": checked_reports,
-            "damage_type_statistics": damage_type_stats
+            "total_reports": stats["total"],
+            "pending_reports": stats["by_status"].get(DamageStatus.PENDING.value, 0),
+            "checked_reports": stats["by_status"].get(DamageStatus.CHECKED.value, 0),
+            "damage_type_statistics": stats["by_type"],
+            "grade_statistics": stats["by_grade"],
+            "subject_statistics": stats["by_subject"]
         },
         "students": list(damage_summary.values())
     }
 
 
+@router.get("/dashboard")
+@cached_report("dashboard", per_grade=False, ttl=settings.DASHBOARD_CACHE_SECONDS)
+async def get_dashboard(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """Счетчики главной страницы одним агрегирующим запросом"""
+    return await ReportStatistics(db).dashboard_counts()
+
+
+@router.get("/cache-stats")
+async def get_report_cache_stats(
+    current_user: User = Depends(get_current_teacher)
+):
+    """Статистика кэша отчетов: попадания, промахи, количество записей"""
+    return report_cache.stats()
+
+
 @router.post("/send-bulk-notifications")
 async def send_bulk_notifications(
     notification_type: str,
     grade: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Отправка массовых уведомлений родителям"""
@@ -301,65 +383,34 @@ async def send_bulk_notifications(
 @router.get("/textbook-history/{textbook_id}")
 async def get_textbook_history(
     textbook_id: int,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    """История конкретного учебника"""
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    """История конкретного учебника (новые события первыми, по страницам)"""
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
-    # Получаем все транзакции
-    transactions = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id
-    ).order_by(Transaction.issued_at).all()
-    
-    # Получаем все отчеты о повреждениях
-    damage_reports = db.query(DamageReport).filter(
-        DamageReport.textbook_id == textbook_id
-    ).order_by(DamageReport.reported_at).all()
-    
-    # Получаем все отчеты о находках
-    found_reports = db.query(FoundReport).filter(
-        FoundReport.textbook_id == textbook_id
-    ).order_by(FoundReport.found_at).all()
-    
-    # Формируем историю
-    history = []
-    
-    for transaction in transactions:
-        student = db.query(Student).filter(Student.id == transaction.student_id).first()
-        history.append({
-            "date": transaction.issued_at,
-            "type": "transaction",
-            "action": transaction.transaction_type.value,
-            "student_name": student.full_name if student else "Unknown",
-            "status": transaction.status.value
-        })
-    
-    for report in damage_reports:
-        student = db.query(Student).filter(Student.id == report.reported_by).first()
-        history.append({
-            "date": report.reported_at,
-            "type": "damage",
-            "action": "damage_reported",
-            "student_name": student.full_name if student else "Unknown",
-            "damage_type": report.damage_type.value,
-            "status": report.status.value
-        })
-    
-    for report in found_reports:
-        student = db.query(Student).filter(Student.id == report.reported_by).first()
-        history.append({
-            "date": report.found_at,
-            "type": "found",
-            "action": "found_reported",
-            "student_name": student.full_name if student else "Unknown",
-            "status": report.status.value
-        })
-    
-    # Сортируем по дате
-    history.sort(key=lambda x: x["date"])
+    if export_format:
+        # Выгрузка содержит всю историю экземпляра, без курсора
+        return export_response(
+            f"textbook-history-{textbook.id}",
+            ["date", "type", "action", "student_name", "status", "damage_type"],
+            (
+                (event["date"], event["type"], event["action"], event["student_name"],
+                 event["status"], event.get("damage_type"))
+                async for event in TextbookTimeline(db).stream(textbook_id)
+            ),
+            export_format
+        )
+    
+    try:
+        history, next_cursor = await TextbookTimeline(db).page(textbook_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "textbook": {
@@ -370,5 +421,6 @@ async def get_textbook_history(
             "author": textbook.author,
             "year": textbook.year
         },
-        "history": history
+        "history": history,
+        "next_cursor": next_cursor
     } 
\ No newline at end of file
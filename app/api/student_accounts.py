@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User, UserRole
 from app.models.student import Student
 from app.schemas.user import UserCreate, UserResponse
@@ -19,12 +21,12 @@ async def create_student_account(
     student_id: int,
     username: str,
     password: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Создание аккаунта для ученика"""
     # Проверяем существование ученика
-    student = db.query(Student).filter(Student.id == student_id).first()
+    student = await db.get(Student, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
@@ -32,17 +34,17 @@ async def create_student_account(
         raise HTTPException(status_code=400, detail="Student is not active")
     
     # Проверяем, что у ученика еще нет аккаунта
-    existing_user = db.query(User).filter(User.student_id == student_id).first()
+    existing_user = await db.scalar(select(User).where(User.student_id == student_id))
     if existing_user:
         raise HTTPException(status_code=400, detail="Student already has an account")
     
     # Проверяем, что username не занят
-    existing_username = db.query(User).filter(User.username == username).first()
+    existing_username = await db.scalar(select(User).where(User.username == username))
     if existing_username:
         raise HTTPException(status_code=400, detail="Username already taken")
     
     # Создаем аккаунт ученика
-    hashed_password = get_password_hash(password)
+    hashed_password = await run_in_threadpool(get_password_hash, password)
     student_user = User(
         username=username,
         password_hash=hashed_password,
@@ -52,8 +54,8 @@ async def create_student_account(
     )
     
     db.add(student_user)
-    db.commit()
-    db.refresh(student_user)
+    await db.commit()
+    await db.refresh(student_user)
     
     return student_user
 
@@ -62,11 +64,11 @@ async def create_student_account(
 async def link_student_to_max(
     user_id: int,
     max_user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Связывание аккаунта ученика с МАКС"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -74,26 +76,26 @@ async def link_student_to_max(
         raise HTTPException(status_code=400, detail="Can only link student accounts")
     
     # Обновляем max_user_id у ученика
-    student = db.query(Student).filter(Student.id == user.student_id).first()
+    student = await db.get(Student, user.student_id)
     if student:
         student.max_user_id = max_user_id
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     
     return user
 
 
 @router.get("/students", response_model=List[dict])
 async def get_students_with_accounts(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение списка учеников с информацией об аккаунтах"""
-    students = db.query(Student).filter(Student.is_active == True).all()
+    students = (await db.scalars(select(Student).where(Student.is_active == True))).all()
     
     result = []
     for student in students:
-        user = db.query(User).filter(User.student_id == student.id).first()
+        user = await db.scalar(select(User).where(User.student_id == student.id))
         result.append({
             "student_id": student.id,
             "full_name": student.full_name,
@@ -112,7 +114,7 @@ async def get_students_with_accounts(
 @router.post("/bulk-create", response_model=List[UserResponse])
 async def bulk_create_student_accounts(
     accounts_data: List[dict],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Массовое создание аккаунтов для учеников"""
@@ -127,22 +129,22 @@ async def bulk_create_student_accounts(
             continue
         
         # Проверяем существование ученика
-        student = db.query(Student).filter(Student.id == student_id).first()
+        student = await db.get(Student, student_id)
         if not student or not student.is_active:
             continue
         
         # Проверяем, что у ученика еще нет аккаунта
-        existing_user = db.query(User).filter(User.student_id == student_id).first()
+        existing_user = await db.scalar(select(User).where(User.student_id == student_id))
         if existing_user:
             continue
         
         # Проверяем, что username не занят
-        existing_username = db.query(User).filter(User.username == username).first()
+        existing_username = await db.scalar(select(User).where(User.username == username))
         if existing_username:
             continue
         
         # Создаем аккаунт ученика
-        hashed_password = get_password_hash(password)
+        hashed_password = await run_in_threadpool(get_password_hash, password)
         student_user = User(
             username=username,
             password_hash=hashed_password,
@@ -154,11 +156,11 @@ async def bulk_create_student_accounts(
         db.add(student_user)
         created_accounts.append(student_user)
     
-    db.commit()
+    await db.commit()
     
     # Обновляем объекты после коммита
     for account in created_accounts:
-        db.refresh(account)
+        await db.refresh(account)
     
     return created_accounts
 
@@ -166,11 +168,11 @@ async def bulk_create_student_accounts(
 @router.post("/{user_id}/activate")
 async def activate_student_account(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Активация аккаунта ученика"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -178,7 +180,7 @@ async def activate_student_account(
         raise HTTPException(status_code=400, detail="Can only activate student accounts")
     
     user.is_active = True
-    db.commit()
+    await db.commit()
     
     return {"message": "Student account activated successfully"}
 
@@ -186,11 +188,11 @@ async def activate_student_account(
 @router.post("/{user_id}/deactivate")
 async def deactivate_student_account(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Деактивация аккаунта ученика"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -198,6 +200,6 @@ async def deactivate_student_account(
         raise HTTPException(status_code=400, detail="Can only deactivate student accounts")
     
     user.is_active = False
-    db.commit()
+    await db.commit()
     
     return {"message": "Student account deactivated successfully"} 
\ No newline at end of file
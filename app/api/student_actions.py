@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
 
 from app.core.database import get_db
@@ -12,10 +13,13 @@ from app.models.textbook import Textbook
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.models.damage_report import DamageReport, DamageType, DamageStatus
 from app.models.found_report import FoundReport, FoundStatus
+from app.models.active_loan import ActiveLoan
 from app.schemas.transaction import TransactionResponse
 from app.api.auth import get_current_active_user
 from app.services.image_storage import ImageStorage
 from app.services.max_bot_client import MaxBotClient
+from app.services.loan_ledger import LoanLedger
+from app.services.report_cache import report_cache
 
 router = APIRouter()
 
@@ -32,40 +36,31 @@ async def get_current_student(current_user: User = Depends(get_current_active_us
 
 @router.get("/my-textbooks", response_model=List[dict])
 async def get_my_textbooks(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_student)
 ):
     """Получение списка учебников ученика"""
     # Получаем активные учебники ученика (выданные, но не возвращенные)
-    issued_transactions = db.query(Transaction).filter(
-        Transaction.student_id == current_user.student_id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).all()
+    rows = (await db.execute(select(Textbook, Transaction).join(
+        ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+    ).join(
+        Transaction, Transaction.id == ActiveLoan.transaction_id
+    ).where(
+        ActiveLoan.student_id == current_user.student_id
+    ))).all()
     
     my_textbooks = []
     
-    for issue_transaction in issued_transactions:
-        # Проверяем, есть ли возврат для этого учебника
-        return_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == issue_transaction.textbook_id,
-            Transaction.transaction_type == TransactionType.RETURN,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
-        
-        if not return_transaction:
-            # Учебник еще не возвращен
-            textbook = db.query(Textbook).filter(Textbook.id == issue_transaction.textbook_id).first()
-            if textbook:
-                my_textbooks.append({
-                    "textbook_id": textbook.id,
-                    "qr_code": textbook.qr_code,
-                    "subject": textbook.subject,
-                    "title": textbook.title,
-                    "author": textbook.author,
-                    "issued_at": issue_transaction.issued_at,
-                    "photos": json.loads(issue_transaction.photos) if issue_transaction.photos else []
-                })
+    for textbook, issue_transaction in rows:
+        my_textbooks.append({
+            "textbook_id": textbook.id,
+            "qr_code": textbook.qr_code,
+            "subject": textbook.subject,
+            "title": textbook.title,
+            "author": textbook.author,
+            "issued_at": issue_transaction.issued_at,
+            "photos": json.loads(issue_transaction.photos) if issue_transaction.photos else []
+        })
     
     return my_textbooks
 
@@ -73,40 +68,24 @@ async def get_my_textbooks(
 @router.get("/textbook/{qr_code}/info")
 async def get_textbook_info_by_qr(
     qr_code: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_student)
 ):
     """Получение информации об учебнике по QR коду"""
-    textbook = db.query(Textbook).filter(Textbook.qr_code == qr_code).first()
-    if not textbook:
+    row = (await db.execute(select(Textbook, ActiveLoan, Student).outerjoin(
+        ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+    ).outerjoin(
+        Student, Student.id == ActiveLoan.student_id
+    ).where(
+        Textbook.qr_code == qr_code
+    ))).first()
+    
+    if not row:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
-    # Проверяем, кому выдан учебник
-    active_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook.id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
-    
-    if not active_transaction:
-        return {
-            "textbook_id": textbook.id,
-            "qr_code": textbook.qr_code,
-            "subject": textbook.subject,
-            "title": textbook.title,
-            "author": textbook.author,
-            "status": "available",
-            "issued_to": None
-        }
-    
-    # Проверяем, есть ли возврат
-    return_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook.id,
-        Transaction.transaction_type == TransactionType.RETURN,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
+    textbook, loan, student = row
     
-    if return_transaction:
+    if not loan:
         return {
             "textbook_id": textbook.id,
             "qr_code": textbook.qr_code,
@@ -118,8 +97,7 @@ async def get_textbook_info_by_qr(
         }
     
     # Учебник выдан
-    student = db.query(Student).filter(Student.id == active_transaction.student_id).first()
-    is_mine = active_transaction.student_id == current_user.student_id
+    is_mine = loan.student_id == current_user.student_id
     
     return {
         "textbook_id": textbook.id,
@@ -130,7 +108,7 @@ async def get_textbook_info_by_qr(
         "status": "issued",
         "issued_to": student.full_name if student else "Unknown",
         "is_mine": is_mine,
-        "issued_at": active_transaction.issued_at
+        "issued_at": loan.issued_at
     }
 
 
@@ -140,30 +118,17 @@ async def report_damage(
     damage_type: DamageType = Form(...),
     description: str = Form(..., min_length=10, max_length=1000),
     photos: List[UploadFile] = File([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_student)
 ):
     """Сообщение о повреждении учебника"""
-    # Проверяем, что учебник выдан этому ученику
-    active_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id,
-        Transaction.student_id == current_user.student_id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
+    # Проверяем, что учебник выдан этому ученику и еще не возвращен
+    loan = await LoanLedger(db).get_loan(textbook_id)
     
-    if not active_transaction:
+    if not loan or loan.student_id != current_user.student_id:
         raise HTTPException(status_code=400, detail="Textbook is not issued to you")
     
-    # Проверяем, что учебник не возвращен
-    return_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id,
-        Transaction.transaction_type == TransactionType.RETURN,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
-    
-    if return_transaction:
-        raise HTTPException(status_code=400, detail="Textbook is already returned")
+    textbook = await db.get(Textbook, textbook_id)
     
     # Сохраняем фото
     image_storage = ImageStorage()
@@ -179,7 +144,11 @@ async def report_damage(
             photo_paths.append(file_path)
     
     # Определяем, в течение ли первой недели после выдачи
-    week_after_issue = active_transaction.issued_at + timedelta(days=7)
+    # PostgreSQL возвращает время с часовым поясом, SQLite - без; сравниваем в UTC без пояса
+    issued_at = loan.issued_at
+    if issued_at.tzinfo is not None:
+        issued_at = issued_at.astimezone(timezone.utc).replace(tzinfo=None)
+    week_after_issue = issued_at + timedelta(days=7)
     is_during_check_period = datetime.utcnow() <= week_after_issue
     
     # Создаем отчет о повреждении
@@ -194,14 +163,15 @@ async def report_damage(
     )
     
     db.add(damage_report)
-    db.commit()
-    db.refresh(damage_report)
+    await db.commit()
+    await report_cache.invalidate_students(db, [current_user.student_id])
+    await db.refresh(damage_report)
     
     # Уведомляем учителя через МАКС
     max_bot = MaxBotClient()
     await max_bot.send_damage_notification(
         student_name=current_user.username,
-        textbook_title=active_transaction.textbook.title,
+        textbook_title=textbook.title,
         damage_type=damage_type.value,
         is_during_check_period=is_during_check_period
     )
@@ -217,30 +187,17 @@ async def report_damage(
 async def report_lost_textbook(
     textbook_id: int = Form(...),
     description: str = Form(..., min_length=10, max_length=1000),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_student)
 ):
     """Сообщение об утере учебника"""
-    # Проверяем, что учебник выдан этому ученику
-    active_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id,
-        Transaction.student_id == current_user.student_id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
+    # Проверяем, что учебник выдан этому ученику и еще не возвращен
+    loan = await LoanLedger(db).get_loan(textbook_id)
     
-    if not active_transaction:
+    if not loan or loan.student_id != current_user.student_id:
         raise HTTPException(status_code=400, detail="Textbook is not issued to you")
     
-    # Проверяем, что учебник не возвращен
-    return_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id,
-        Transaction.transaction_type == TransactionType.RETURN,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
-    
-    if return_transaction:
-        raise HTTPException(status_code=400, detail="Textbook is already returned")
+    textbook = await db.get(Textbook, textbook_id)
     
     # Создаем отчет о повреждении типа "утерян"
     damage_report = DamageReport(
@@ -254,16 +211,17 @@ async def report_lost_textbook(
     )
     
     db.add(damage_report)
-    db.commit()
-    db.refresh(damage_report)
+    await db.commit()
+    await report_cache.invalidate_students(db, [current_user.student_id])
+    await db.refresh(damage_report)
     
     # Уведомляем учителя и родителей через МАКС
     max_bot = MaxBotClient()
-    student = db.query(Student).filter(Student.id == current_user.student_id).first()
+    student = await db.get(Student, current_user.student_id)
     
     await max_bot.send_lost_notification(
         student_name=student.full_name,
-        textbook_title=active_transaction.textbook.title,
+        textbook_title=textbook.title,
         parent_phone=student.parent_phone
     )
     
@@ -279,12 +237,12 @@ async def report_found_textbook(
     found_location: str = Form(..., min_length=5, max_length=200),
     description: Optional[str] = Form(None, max_length=500),
     photos: List[UploadFile] = File([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_student)
 ):
     """Сообщение о найденном учебнике"""
     # Находим учебник по QR коду
-    textbook = db.query(Textbook).filter(Textbook.qr_code == qr_code).first()
+    textbook = await db.scalar(select(Textbook).where(Textbook.qr_code == qr_code))
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
@@ -313,12 +271,13 @@ async def report_found_textbook(
     )
     
     db.add(found_report)
-    db.commit()
-    db.refresh(found_report)
+    await db.commit()
+    await report_cache.invalidate_students(db, [current_user.student_id])
+    await db.refresh(found_report)
     
     # Уведомляем учителя через МАКС
     max_bot = MaxBotClient()
-    student = db.query(Student).filter(Student.id == current_user.student_id).first()
+    student = await db.get(Student, current_user.student_id)
     
     await max_bot.send_found_notification(
         finder_name=student.full_name,
@@ -334,31 +293,31 @@ async def report_found_textbook(
 
 @router.get("/damage-reminder")
 async def get_damage_reminder(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_student)
 ):
     """Получение напоминания о необходимости проверить повреждения"""
     # Получаем учебники, выданные в течение последней недели
     week_ago = datetime.utcnow() - timedelta(days=7)
     
-    recent_transactions = db.query(Transaction).filter(
+    recent_transactions = (await db.scalars(select(Transaction).where(
         Transaction.student_id == current_user.student_id,
         Transaction.transaction_type == TransactionType.ISSUE,
         Transaction.status == TransactionStatus.COMPLETED,
         Transaction.issued_at >= week_ago
-    ).all()
+    ))).all()
     
     textbooks_to_check = []
     
     for transaction in recent_transactions:
         # Проверяем, есть ли уже отчеты о повреждениях
-        damage_reports = db.query(DamageReport).filter(
+        damage_reports = (await db.scalars(select(DamageReport).where(
             DamageReport.textbook_id == transaction.textbook_id,
             DamageReport.reported_by == current_user.id
-        ).all()
+        ))).all()
         
         if not damage_reports:
-            textbook = db.query(Textbook).filter(Textbook.id == transaction.textbook_id).first()
+            textbook = await db.get(Textbook, transaction.textbook_id)
             if textbook:
                 textbooks_to_check.append({
                     "textbook_id": textbook.id,
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User
 from app.models.student import Student
 from app.schemas.student import StudentCreate, StudentUpdate, StudentResponse, StudentList
 from app.api.auth import get_current_teacher
+from app.services.report_cache import report_cache
+from app.services.export import ExportFormat, export_response, stream_scalars
+from app.services.pagination import KeysetPage, set_next_cursor
 
 router = APIRouter()
 
@@ -14,16 +18,16 @@ router = APIRouter()
 @router.post("/", response_model=StudentResponse)
 async def create_student(
     student: StudentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Создание нового ученика"""
     # Проверяем, что ученик с таким именем и классом не существует
-    existing_student = db.query(Student).filter(
+    existing_student = await db.scalar(select(Student).where(
         Student.first_name == student.first_name,
         Student.last_name == student.last_name,
         Student.grade == student.grade
-    ).first()
+    ))
     
     if existing_student:
         raise HTTPException(status_code=400, detail="Student already exists")
@@ -39,23 +43,27 @@ async def create_student(
     )
     
     db.add(db_student)
-    db.commit()
-    db.refresh(db_student)
+    await db.commit()
+    report_cache.invalidate(student.grade)
+    await db.refresh(db_student)
     
     return db_student
 
 
 @router.get("/", response_model=List[StudentList])
 async def get_students(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     grade: Optional[str] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    """Получение списка учеников с фильтрацией"""
-    query = db.query(Student)
+    """Получение списка учеников с фильтрацией (format=csv|xlsx - выгрузка всего списка)"""
+    query = select(Student)
     
     if grade:
         query = query.filter(Student.grade == grade)
@@ -63,18 +71,31 @@ async def get_students(
     if is_active is not None:
         query = query.filter(Student.is_active == is_active)
     
-    students = query.offset(skip).limit(limit).all()
+    if export_format:
+        return export_response(
+            "students",
+            ["id", "full_name", "grade", "phone", "parent_phone", "is_active"],
+            (
+                (student.id, student.full_name, student.grade, student.phone,
+                 student.parent_phone, student.is_active)
+                async for student in stream_scalars(db, query.order_by(Student.id))
+            ),
+            export_format
+        )
+    
+    students, next_cursor = await KeysetPage(db, Student).fetch(query, cursor, skip, limit)
+    set_next_cursor(response, next_cursor)
     return students
 
 
 @router.get("/{student_id}", response_model=StudentResponse)
 async def get_student(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение конкретного ученика"""
-    student = db.query(Student).filter(Student.id == student_id).first()
+    student = await db.get(Student, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     return student
@@ -84,38 +105,42 @@ async def get_student(
 async def update_student(
     student_id: int,
     student_update: StudentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Обновление данных ученика"""
-    db_student = db.query(Student).filter(Student.id == student_id).first()
+    db_student = await db.get(Student, student_id)
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     # Обновляем только переданные поля
+    previous_grade = db_student.grade
     update_data = student_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_student, field, value)
     
-    db.commit()
-    db.refresh(db_student)
+    grades = {previous_grade, db_student.grade}
+    await db.commit()
+    report_cache.invalidate(*grades)
+    await db.refresh(db_student)
     return db_student
 
 
 @router.delete("/{student_id}")
 async def delete_student(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Удаление ученика (мягкое удаление - деактивация)"""
-    db_student = db.query(Student).filter(Student.id == student_id).first()
+    db_student = await db.get(Student, student_id)
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     # Мягкое удаление - деактивируем ученика
     db_student.is_active = False
-    db.commit()
+    await db.commit()
+    report_cache.invalidate(db_student.grade)
     
     return {"message": "Student deactivated successfully"}
 
@@ -123,21 +148,21 @@ async def delete_student(
 @router.get("/grade/{grade}", response_model=List[StudentList])
 async def get_students_by_grade(
     grade: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение всех учеников конкретного класса"""
-    students = db.query(Student).filter(
+    students = (await db.scalars(select(Student).where(
         Student.grade == grade,
         Student.is_active == True
-    ).all()
+    ))).all()
     return students
 
 
 @router.post("/bulk", response_model=List[StudentResponse])
 async def create_students_bulk(
     students: List[StudentCreate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Массовое создание учеников"""
@@ -145,11 +170,11 @@ async def create_students_bulk(
     
     for student_data in students:
         # Проверяем, что ученик не существует
-        existing_student = db.query(Student).filter(
+        existing_student = await db.scalar(select(Student).where(
             Student.first_name == student_data.first_name,
             Student.last_name == student_data.last_name,
             Student.grade == student_data.grade
-        ).first()
+        ))
         
         if existing_student:
             continue  # Пропускаем существующих учеников
@@ -167,10 +192,11 @@ async def create_students_bulk(
         db.add(db_student)
         created_students.append(db_student)
     
-    db.commit()
+    await db.commit()
+    report_cache.invalidate(*{student.grade for student in students})
     
     # Обновляем объекты после коммита
     for student in created_students:
-        db.refresh(student)
+        await db.refresh(student)
     
     return created_students 
\ No newline at end of file
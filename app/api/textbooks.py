@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import uuid
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User
+from app.models.student import Student
 from app.models.textbook import Textbook
+from app.models.active_loan import ActiveLoan
 from app.schemas.textbook import (
     TextbookCreate, TextbookUpdate, TextbookResponse, 
-    TextbookList, TextbookBulkCreate
+    TextbookList, TextbookBulkCreate,
+    QRResolveRequest, QRResolveResponse, QRResolvedTextbook, TextbookHolder
 )
 from app.services.qr_generator import QRGenerator
 from app.api.auth import get_current_teacher
+from app.services.report_cache import report_cache
+from app.services.export import ExportFormat, export_response, stream_rows
+from app.services.pagination import KeysetPage, set_next_cursor
 
 router = APIRouter()
 
@@ -24,7 +31,7 @@ def generate_unique_qr_code() -> str:
 @router.post("/", response_model=TextbookResponse)
 async def create_textbook(
     textbook: TextbookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     # Генерируем уникальный QR код
@@ -44,8 +51,8 @@ async def create_textbook(
     )
     
     db.add(db_textbook)
-    db.commit()
-    db.refresh(db_textbook)
+    await db.commit()
+    await db.refresh(db_textbook)
     
     # Генерируем QR код изображение
     qr_generator = QRGenerator()
@@ -57,7 +64,7 @@ async def create_textbook(
 @router.post("/bulk", response_model=List[TextbookResponse])
 async def create_textbooks_bulk(
     request: TextbookBulkCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Массовое создание учебников"""
@@ -88,12 +95,12 @@ async def create_textbooks_bulk(
         db.add(db_textbook)
         textbooks.append(db_textbook)
     
-    db.commit()
+    await db.commit()
     
     # Генерируем QR коды для всех учебников
     qr_generator = QRGenerator()
     for textbook in textbooks:
-        db.refresh(textbook)
+        await db.refresh(textbook)
         qr_generator.generate_qr_code(textbook.qr_code, textbook.id)
     
     return textbooks
@@ -101,15 +108,18 @@ async def create_textbooks_bulk(
 
 @router.get("/", response_model=List[TextbookList])
 async def get_textbooks(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     subject: Optional[str] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    """Получение списка учебников с фильтрацией"""
-    query = db.query(Textbook)
+    """Получение списка учебников с фильтрацией (format=csv|xlsx - выгрузка всего списка)"""
+    query = select(Textbook)
     
     if subject:
         query = query.filter(Textbook.subject.ilike(f"%{subject}%"))
@@ -117,18 +127,29 @@ async def get_textbooks(
     if is_active is not None:
         query = query.filter(Textbook.is_active == is_active)
     
-    textbooks = query.offset(skip).limit(limit).all()
+    if export_format:
+        columns = [Textbook.id, Textbook.qr_code, Textbook.subject, Textbook.title,
+                   Textbook.author, Textbook.inventory_number, Textbook.is_active]
+        return export_response(
+            "textbooks",
+            [column.key for column in columns],
+            stream_rows(db, query.with_only_columns(*columns).order_by(Textbook.id)),
+            export_format
+        )
+    
+    textbooks, next_cursor = await KeysetPage(db, Textbook).fetch(query, cursor, skip, limit)
+    set_next_cursor(response, next_cursor)
     return textbooks
 
 
 @router.get("/{textbook_id}", response_model=TextbookResponse)
 async def get_textbook(
     textbook_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение конкретного учебника"""
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     return textbook
@@ -137,25 +158,70 @@ async def get_textbook(
 @router.get("/qr/{qr_code}", response_model=TextbookResponse)
 async def get_textbook_by_qr(
     qr_code: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение учебника по QR коду"""
-    textbook = db.query(Textbook).filter(Textbook.qr_code == qr_code).first()
+    textbook = await db.scalar(select(Textbook).where(Textbook.qr_code == qr_code))
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     return textbook
 
 
+@router.post("/qr/resolve", response_model=QRResolveResponse)
+async def resolve_qr_codes(
+    request: QRResolveRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """Учебники по списку QR кодов с текущим владельцем - один запрос на всю стопку"""
+    rows = {
+        textbook.qr_code: (textbook, loan, student)
+        for textbook, loan, student in await db.execute(select(Textbook, ActiveLoan, Student).outerjoin(
+            ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+        ).outerjoin(
+            Student, Student.id == ActiveLoan.student_id
+        ).where(
+            Textbook.qr_code.in_(set(request.qr_codes))
+        ))
+    }
+    
+    textbooks = []
+    not_found = []
+    for qr_code in dict.fromkeys(request.qr_codes):
+        if qr_code not in rows:
+            not_found.append(qr_code)
+            continue
+        
+        textbook, loan, student = rows[qr_code]
+        holder = None
+        if loan:
+            holder = TextbookHolder(
+                student_id=loan.student_id,
+                full_name=student.full_name if student else "Unknown",
+                grade=student.grade if student else None,
+                issued_at=loan.issued_at,
+                transaction_id=loan.transaction_id
+            )
+        
+        textbooks.append(QRResolvedTextbook(
+            **TextbookList.model_validate(textbook).model_dump(),
+            available=textbook.is_active and loan is None,
+            holder=holder
+        ))
+    
+    return QRResolveResponse(textbooks=textbooks, not_found=not_found)
+
+
 @router.put("/{textbook_id}", response_model=TextbookResponse)
 async def update_textbook(
     textbook_id: int,
     textbook_update: TextbookUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Обновление учебника"""
-    db_textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    db_textbook = await db.get(Textbook, textbook_id)
     if not db_textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
@@ -164,37 +230,42 @@ async def update_textbook(
     for field, value in update_data.items():
         setattr(db_textbook, field, value)
     
-    db.commit()
-    db.refresh(db_textbook)
+    await db.commit()
+    # Название и предмет учебника входят в отчеты всех классов
+    report_cache.invalidate()
+    await db.refresh(db_textbook)
     return db_textbook
 
 
 @router.delete("/{textbook_id}")
 async def delete_textbook(
     textbook_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Удаление учебника (мягкое удаление - деактивация)"""
-    db_textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    db_textbook = await db.get(Textbook, textbook_id)
     if not db_textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
     # Мягкое удаление - деактивируем учебник
     db_textbook.is_active = False
-    db.commit()
-    
+    await db.commit()
+    # У учебника нет класса: как и при обновлении, сбрасываются все отчеты,
+    # включая счетчик активных учебников на главной странице
+    report_cache.invalidate()
+
     return {"message": "Textbook deactivated successfully"}
 
 
 @router.get("/qr-code/{textbook_id}")
 async def get_qr_code_image(
     textbook_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение изображения QR кода для учебника"""
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
@@ -1,22 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File, Form, Query
+from sqlalchemy import exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from datetime import datetime
+import json
 import os
 import uuid
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.config import settings
 from app.models.user import User
 from app.models.student import Student
 from app.models.textbook import Textbook
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.active_loan import ActiveLoan
 from app.schemas.transaction import (
-    TransactionResponse, TransactionList, BulkIssueRequest, BulkReturnRequest
+    TransactionResponse, TransactionList, BulkIssueRequest, BulkReturnRequest,
+    BulkTransactionResponse, BulkRejection, BulkRejectReason,
+    ClassIssueRequest, ClassIssueResponse, ClassIssueStudent, ClassIssueCopy, ClassIssueShortage,
+    ScanBatchRequest, ScanBatchResponse, ScanEventResult, ScanStatus,
+    TransferRequest, BulkTransferRequest, TransferResult, BulkTransferResponse
 )
 from app.api.auth import get_current_teacher
 from app.services.image_storage import ImageStorage
 from app.services.parent_notifications import ParentNotificationService
+from app.services.loan_ledger import LoanConflict, LoanLedger
+from app.services.scan_ingest import ScanIngest
+from app.services.bulk_insert import insert_returning
+from app.services.report_cache import report_cache
+from app.services.export import ExportFormat, export_response, stream_rows
+from app.services.pagination import KeysetPage, set_next_cursor
 
 router = APIRouter()
 
@@ -48,12 +62,12 @@ async def issue_textbook(
     student_id: int = Form(...),
     notes: Optional[str] = Form(None),
     photos: List[UploadFile] = File([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Выдача учебника ученику"""
     # Проверяем существование учебника
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
@@ -61,23 +75,13 @@ async def issue_textbook(
         raise HTTPException(status_code=400, detail="Textbook is not active")
     
     # Проверяем существование ученика
-    student = db.query(Student).filter(Student.id == student_id).first()
+    student = await db.get(Student, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     if not student.is_active:
         raise HTTPException(status_code=400, detail="Student is not active")
     
-    # Проверяем, не выдан ли уже учебник
-    active_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
-    
-    if active_transaction:
-        raise HTTPException(status_code=400, detail="Textbook is already issued")
-    
     # Сохраняем фото
     photo_paths = await save_transaction_photos(photos)
     
@@ -88,14 +92,23 @@ async def issue_textbook(
         transaction_type=TransactionType.ISSUE,
         status=TransactionStatus.COMPLETED,
         notes=notes,
-        photos=photo_paths,
+        photos=json.dumps(photo_paths),
         issued_by=current_user.id,
         issued_at=datetime.utcnow()
     )
     
+    # Занятость экземпляра не проверяется заранее: active_loans допускает одну
+    # выдачу на экземпляр, и одновременная выдача с другой станции не пройдет вставку
     db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
+    try:
+        await LoanLedger(db).open_loan(transaction)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        await ImageStorage().delete_images(photo_paths)
+        raise HTTPException(status_code=400, detail="Textbook is already issued")
+    report_cache.invalidate(student.grade)
+    await db.refresh(transaction)
     
     # Уведомляем родителей
     notification_service = ParentNotificationService()
@@ -109,24 +122,22 @@ async def return_textbook(
     textbook_id: int = Form(...),
     notes: Optional[str] = Form(None),
     photos: List[UploadFile] = File([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Возврат учебника"""
     # Проверяем существование учебника
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
-    # Находим активную транзакцию выдачи
-    issue_transaction = db.query(Transaction).filter(
-        Transaction.textbook_id == textbook_id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).first()
+    # Находим активную выдачу
+    ledger = LoanLedger(db)
+    loan = await ledger.get_loan(textbook_id)
     
-    if not issue_transaction:
+    if not loan:
         raise HTTPException(status_code=400, detail="Textbook is not issued")
+    student_id = loan.student_id
     
     # Сохраняем фото
     photo_paths = await save_transaction_photos(photos)
@@ -134,145 +145,596 @@ async def return_textbook(
     # Создаем транзакцию возврата
     return_transaction = Transaction(
         textbook_id=textbook_id,
-        student_id=issue_transaction.student_id,
+        student_id=student_id,
         transaction_type=TransactionType.RETURN,
         status=TransactionStatus.COMPLETED,
         notes=notes,
-        photos=photo_paths,
+        photos=json.dumps(photo_paths),
         issued_by=current_user.id,
         issued_at=datetime.utcnow(),
         returned_at=datetime.utcnow()
     )
     
     db.add(return_transaction)
-    db.commit()
-    db.refresh(return_transaction)
+    if not await ledger.close_loan(loan, return_transaction):
+        # Выдачу уже закрыл одновременный возврат с другой станции
+        await db.rollback()
+        await ImageStorage().delete_images(photo_paths)
+        raise HTTPException(status_code=400, detail="Textbook is not issued")
+    await db.commit()
+    await report_cache.invalidate_students(db, [student_id])
+    await db.refresh(return_transaction)
     
     # Уведомляем родителей
     notification_service = ParentNotificationService()
-    await notification_service.notify_return_textbooks(issue_transaction.student_id, [textbook_id], db)
+    await notification_service.notify_return_textbooks(student_id, [textbook_id], db)
     
     return return_transaction
 
 
-@router.post("/bulk-issue", response_model=List[TransactionResponse])
+async def check_issue_candidates(
+    db: AsyncSession,
+    textbook_ids: List[int]
+) -> Tuple[List[Textbook], List[BulkRejection]]:
+    """Проверяет список экземпляров для выдачи одним запросом: учебник и его текущая выдача"""
+    textbook_states = {
+        textbook.id: (textbook, on_loan)
+        for textbook, on_loan in await db.execute(select(
+            Textbook, ActiveLoan.textbook_id.isnot(None)
+        ).outerjoin(
+            ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+        ).where(
+            Textbook.id.in_(set(textbook_ids))
+        ))
+    }
+    
+    accepted = []
+    rejected = []
+    seen_ids = set()
+    
+    for textbook_id in textbook_ids:
+        textbook, on_loan = textbook_states.get(textbook_id, (None, False))
+        
+        if textbook_id in seen_ids:
+            reason = BulkRejectReason.DUPLICATE
+        elif textbook is None:
+            reason = BulkRejectReason.NOT_FOUND
+        elif not textbook.is_active:
+            reason = BulkRejectReason.INACTIVE
+        elif on_loan:
+            reason = BulkRejectReason.ALREADY_ISSUED
+        else:
+            reason = None
+            accepted.append(textbook)
+        
+        if reason:
+            rejected.append(BulkRejection(textbook_id=textbook_id, reason=reason))
+        seen_ids.add(textbook_id)
+    
+    return accepted, rejected
+
+
+async def insert_issue_transactions(
+    db: AsyncSession,
+    assignments: List[Tuple[int, int]],
+    issued_by: int,
+    notes: Optional[str] = None
+) -> List[Transaction]:
+    """
+    Выдачи пар (textbook_id, student_id) одной пачкой вместе с active_loans (без коммита).
+    
+    Транзакции возвращаются в порядке assignments.
+    """
+    if not assignments:
+        return []
+    
+    issued_at = datetime.utcnow()
+    transactions = await insert_returning(
+        db,
+        Transaction,
+        [
+            {
+                "textbook_id": textbook_id,
+                "student_id": student_id,
+                "transaction_type": TransactionType.ISSUE,
+                "status": TransactionStatus.COMPLETED,
+                "notes": notes,
+                "issued_by": issued_by,
+                "issued_at": issued_at
+            }
+            for textbook_id, student_id in assignments
+        ],
+        "textbook_id"
+    )
+    try:
+        await LoanLedger(db).open_loans(transactions)
+    except LoanConflict:
+        # Экземпляр выдан другой станцией между проверкой и вставкой
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Textbooks were issued concurrently, retry the request")
+    
+    return transactions
+
+
+async def insert_return_transactions(
+    db: AsyncSession,
+    loans: List[Tuple[int, int, int]],
+    issued_by: int,
+    notes: Optional[str] = None
+) -> Tuple[List[Transaction], List[int]]:
+    """
+    Возвраты по выдачам (textbook_id, student_id, issue_transaction_id) одной пачкой
+    с закрытием active_loans (без коммита).
+    
+    Выдачи закрываются условно до вставки возвратов: выдачи, которые тем временем
+    закрыл другой запрос, возврата не получают и возвращаются вторым списком (textbook_id).
+    Транзакции возвращаются в порядке loans.
+    """
+    if not loans:
+        return [], []
+    
+    closed = await LoanLedger(db).close_loans(
+        (textbook_id, issue_transaction_id) for textbook_id, _, issue_transaction_id in loans
+    )
+    returned_concurrently = [textbook_id for textbook_id, _, _ in loans if textbook_id not in closed]
+    
+    # Возвраты ссылаются на закрытые выдачи
+    returned_at = datetime.utcnow()
+    transactions = await insert_returning(
+        db,
+        Transaction,
+        [
+            {
+                "textbook_id": textbook_id,
+                "student_id": student_id,
+                "transaction_type": TransactionType.RETURN,
+                "status": TransactionStatus.COMPLETED,
+                "notes": notes,
+                "issued_by": issued_by,
+                "issued_at": returned_at,
+                "returned_at": returned_at,
+                "issue_transaction_id": issue_transaction_id
+            }
+            for textbook_id, student_id, issue_transaction_id in loans
+            if textbook_id in closed
+        ],
+        "textbook_id"
+    )
+    
+    return transactions, returned_concurrently
+
+
+@router.post("/bulk-issue", response_model=BulkTransactionResponse)
 async def bulk_issue_textbooks(
     request: BulkIssueRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Массовая выдача учебников"""
     # Проверяем существование ученика
-    student = db.query(Student).filter(Student.id == request.student_id).first()
+    student = await db.get(Student, request.student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     if not student.is_active:
         raise HTTPException(status_code=400, detail="Student is not active")
     
-    transactions = []
+    textbooks, rejected = await check_issue_candidates(db, request.textbook_ids)
+    transactions = await insert_issue_transactions(
+        db,
+        [(textbook.id, request.student_id) for textbook in textbooks],
+        current_user.id,
+        request.notes
+    )
+    
+    # Ответ собирается до коммита: после него объекты пришлось бы перечитывать
+    response = BulkTransactionResponse(
+        transactions=[TransactionResponse.model_validate(transaction) for transaction in transactions],
+        rejected=rejected
+    )
+    grade = student.grade
     
-    for textbook_id in request.textbook_ids:
-        # Проверяем существование учебника
-        textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
-        if not textbook or not textbook.is_active:
-            continue
-        
-        # Проверяем, не выдан ли уже учебник
-        active_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == textbook_id,
-            Transaction.transaction_type == TransactionType.ISSUE,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
-        
-        if active_transaction:
-            continue
-        
-        # Создаем транзакцию выдачи
-        transaction = Transaction(
-            textbook_id=textbook_id,
-            student_id=request.student_id,
-            transaction_type=TransactionType.ISSUE,
-            status=TransactionStatus.COMPLETED,
-            notes=request.notes,
-            issued_by=current_user.id,
-            issued_at=datetime.utcnow()
+    await db.commit()
+    report_cache.invalidate(grade)
+    
+    return response
+
+
+@router.post("/class-issue", response_model=ClassIssueResponse)
+async def issue_textbooks_to_class(
+    request: ClassIssueRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """Выдача комплекта учебников всем активным ученикам класса"""
+    selectors = [request.titles, request.subjects, request.textbook_ids]
+    if sum(selector is not None for selector in selectors) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Specify exactly one of titles, subjects or textbook_ids"
         )
-        
-        db.add(transaction)
-        transactions.append(transaction)
     
-    db.commit()
+    students = (await db.scalars(select(Student).where(
+        Student.grade == request.grade,
+        Student.is_active == True
+    ).order_by(Student.last_name, Student.first_name, Student.id))).all()
+    
+    if not students:
+        raise HTTPException(status_code=404, detail="No active students in grade")
+    
+    # Свободные экземпляры комплекта
+    rejected = []
+    if request.textbook_ids:
+        copies, rejected = await check_issue_candidates(db, request.textbook_ids)
+    else:
+        copies_query = select(Textbook).where(
+            Textbook.is_active == True,
+            ~exists().where(ActiveLoan.textbook_id == Textbook.id)
+        )
+        if request.titles:
+            copies_query = copies_query.filter(Textbook.title.in_(request.titles))
+        else:
+            copies_query = copies_query.filter(Textbook.subject.in_(request.subjects))
+        copies = (await db.scalars(copies_query)).all()
+    
+    # Учебники, которые уже на руках у учеников класса, повторно не выдаются
+    held = set(
+        (await db.execute(select(ActiveLoan.student_id, Textbook.subject, Textbook.title).join(
+            Textbook, Textbook.id == ActiveLoan.textbook_id
+        ).join(
+            Student, Student.id == ActiveLoan.student_id
+        ).where(
+            Student.grade == request.grade
+        ))).all()
+    )
     
-    # Обновляем объекты после коммита
-    for transaction in transactions:
-        db.refresh(transaction)
+    # Каждое название комплекта раздается по одному экземпляру ученикам по списку
+    kits = {}
+    for copy in sorted(copies, key=lambda textbook: (textbook.subject, textbook.title, textbook.id)):
+        kits.setdefault((copy.subject, copy.title), []).append(copy)
+    
+    assignments = []
+    shortages = []
+    for (subject, title), free_copies in kits.items():
+        recipients = [student for student in students if (student.id, subject, title) not in held]
+        assignments.extend(zip(free_copies, recipients))
+        if len(recipients) > len(free_copies):
+            shortages.append(ClassIssueShortage(
+                subject=subject, title=title, missing=len(recipients) - len(free_copies)
+            ))
+    
+    # Запрошенные названия и предметы без единого свободного экземпляра
+    if request.titles:
+        held_titles = {(student_id, title) for student_id, _, title in held}
+        for title in dict.fromkeys(request.titles):
+            if not any(kit_title == title for _, kit_title in kits):
+                missing = sum((student.id, title) not in held_titles for student in students)
+                if missing:
+                    shortages.append(ClassIssueShortage(subject=None, title=title, missing=missing))
+    elif request.subjects:
+        for subject in dict.fromkeys(request.subjects):
+            if not any(kit_subject == subject for kit_subject, _ in kits):
+                shortages.append(ClassIssueShortage(subject=subject, title=None, missing=len(students)))
+    
+    transactions = await insert_issue_transactions(
+        db,
+        [(copy.id, student.id) for copy, student in assignments],
+        current_user.id,
+        request.notes
+    )
     
-    return transactions
+    # Манифест: кто какой экземпляр получил
+    manifest = {
+        student.id: ClassIssueStudent(student_id=student.id, full_name=student.full_name)
+        for student in students
+    }
+    transaction_ids = {transaction.textbook_id: transaction.id for transaction in transactions}
+    for copy, student in assignments:
+        manifest[student.id].textbooks.append(ClassIssueCopy(
+            transaction_id=transaction_ids[copy.id],
+            textbook_id=copy.id,
+            qr_code=copy.qr_code,
+            subject=copy.subject,
+            title=copy.title
+        ))
+    
+    response = ClassIssueResponse(
+        grade=request.grade,
+        issued_count=len(transactions),
+        manifest=list(manifest.values()),
+        shortages=shortages,
+        rejected=rejected
+    )
+    
+    await db.commit()
+    report_cache.invalidate(request.grade)
+    
+    return response
 
 
-@router.post("/bulk-return", response_model=List[TransactionResponse])
+@router.post("/bulk-return", response_model=BulkTransactionResponse)
 async def bulk_return_textbooks(
     request: BulkReturnRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Массовый возврат учебников"""
-    transactions = []
+    # Все id сопоставляются с открытыми выдачами одним запросом
+    textbook_loans = {
+        textbook_id: loan
+        for textbook_id, *loan in await db.execute(select(
+            Textbook.id, ActiveLoan.textbook_id, ActiveLoan.student_id, ActiveLoan.transaction_id
+        ).outerjoin(
+            ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+        ).where(
+            Textbook.id.in_(set(request.textbook_ids))
+        ))
+    }
+    
+    loans = []
+    rejected = []
+    seen_ids = set()
     
     for textbook_id in request.textbook_ids:
-        # Проверяем существование учебника
-        textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
-        if not textbook:
-            continue
+        if textbook_id in seen_ids:
+            reason = BulkRejectReason.DUPLICATE
+        elif textbook_id not in textbook_loans:
+            reason = BulkRejectReason.NOT_FOUND
+        elif textbook_loans[textbook_id][0] is None:
+            reason = BulkRejectReason.NOT_ISSUED
+        else:
+            reason = None
+            loans.append(textbook_loans[textbook_id])
         
-        # Находим активную транзакцию выдачи
-        issue_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == textbook_id,
-            Transaction.transaction_type == TransactionType.ISSUE,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
+        if reason:
+            rejected.append(BulkRejection(textbook_id=textbook_id, reason=reason))
+        seen_ids.add(textbook_id)
+    
+    transactions, returned_concurrently = await insert_return_transactions(
+        db, loans, current_user.id, request.notes
+    )
+    # Экземпляры, которые одновременно приняла другая станция, уже не на руках
+    rejected += [
+        BulkRejection(textbook_id=textbook_id, reason=BulkRejectReason.NOT_ISSUED)
+        for textbook_id in returned_concurrently
+    ]
+    
+    # Ответ собирается до коммита: после него объекты пришлось бы перечитывать
+    response = BulkTransactionResponse(
+        transactions=[TransactionResponse.model_validate(transaction) for transaction in transactions],
+        rejected=rejected
+    )
+    student_ids = [transaction.student_id for transaction in transactions]
+    
+    await db.commit()
+    await report_cache.invalidate_students(db, student_ids)
+    
+    return response
+
+
+async def transfer_loans(
+    db: AsyncSession,
+    textbook_ids: List[int],
+    to_student: Student,
+    issued_by: int,
+    notes: Optional[str] = None
+) -> Tuple[List[TransferResult], List[BulkRejection]]:
+    """
+    Передача экземпляров ученику: возврат от прежних владельцев и выдача новому
+    одним набором пачечных запросов (без коммита).
+    """
+    # Все id сопоставляются с учебником и открытой выдачей одним запросом
+    textbook_loans = {
+        textbook_id: (is_active, loan)
+        for textbook_id, is_active, *loan in await db.execute(select(
+            Textbook.id, Textbook.is_active,
+            ActiveLoan.textbook_id, ActiveLoan.student_id, ActiveLoan.transaction_id
+        ).outerjoin(
+            ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+        ).where(
+            Textbook.id.in_(set(textbook_ids))
+        ))
+    }
+    
+    loans = []
+    rejected = []
+    seen_ids = set()
+    
+    for textbook_id in textbook_ids:
+        is_active, loan = textbook_loans.get(textbook_id, (None, None))
         
-        if not issue_transaction:
-            continue
+        if textbook_id in seen_ids:
+            reason = BulkRejectReason.DUPLICATE
+        elif loan is None:
+            reason = BulkRejectReason.NOT_FOUND
+        elif not is_active:
+            reason = BulkRejectReason.INACTIVE
+        elif loan[0] is None:
+            reason = BulkRejectReason.NOT_ISSUED
+        elif loan[1] == to_student.id:
+            reason = BulkRejectReason.SAME_STUDENT
+        else:
+            reason = None
+            loans.append(tuple(loan))
         
-        # Создаем транзакцию возврата
-        return_transaction = Transaction(
+        if reason:
+            rejected.append(BulkRejection(textbook_id=textbook_id, reason=reason))
+        seen_ids.add(textbook_id)
+    
+    # Сначала закрываются старые выдачи: в active_loans одна строка на экземпляр
+    returns, returned_concurrently = await insert_return_transactions(db, loans, issued_by, notes)
+    if returned_concurrently:
+        # Выдачу закрыла или заменила другая станция после чтения: передача
+        # выполняется целиком или не выполняется
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Textbooks were returned or transferred concurrently, retry the request")
+    issues = await insert_issue_transactions(
+        db, [(textbook_id, to_student.id) for textbook_id, _, _ in loans], issued_by, notes
+    )
+    
+    return_ids = {transaction.textbook_id: transaction.id for transaction in returns}
+    issue_ids = {transaction.textbook_id: transaction.id for transaction in issues}
+    transfers = [
+        TransferResult(
             textbook_id=textbook_id,
-            student_id=issue_transaction.student_id,
-            transaction_type=TransactionType.RETURN,
-            status=TransactionStatus.COMPLETED,
-            notes=request.notes,
-            issued_by=current_user.id,
-            issued_at=datetime.utcnow(),
-            returned_at=datetime.utcnow()
+            from_student_id=from_student_id,
+            to_student_id=to_student.id,
+            return_transaction_id=return_ids[textbook_id],
+            issue_transaction_id=issue_ids[textbook_id]
         )
-        
-        db.add(return_transaction)
-        transactions.append(return_transaction)
+        for textbook_id, from_student_id, _ in loans
+    ]
+    
+    return transfers, rejected
+
+
+async def get_transfer_recipient(db: AsyncSession, student_id: int) -> Student:
+    """Ученик, которому передаются учебники; 404/400, если он не найден или не активен"""
+    student = await db.get(Student, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    
+    if not student.is_active:
+        raise HTTPException(status_code=400, detail="Student is not active")
     
-    db.commit()
+    return student
+
+
+async def notify_transfer(db: AsyncSession, to_student_id: int, transfers: List[TransferResult]) -> None:
+    """Одно уведомление каждой семье: получателю и каждому прежнему владельцу"""
+    if not transfers:
+        return
     
-    # Обновляем объекты после коммита
-    for transaction in transactions:
-        db.refresh(transaction)
+    handed_over = {}
+    for transfer in transfers:
+        handed_over.setdefault(transfer.from_student_id, []).append(transfer.textbook_id)
     
-    return transactions
+    notification_service = ParentNotificationService()
+    await notification_service.notify_transfer_textbooks(to_student_id, handed_over, db)
+
+
+@router.post("/transfer", response_model=TransferResult)
+async def transfer_textbook(
+    request: TransferRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """Передача учебника от одного ученика другому в одной транзакции БД"""
+    student = await get_transfer_recipient(db, request.to_student_id)
+    transfers, rejected = await transfer_loans(
+        db, [request.textbook_id], student, current_user.id, request.notes
+    )
+    
+    if rejected:
+        reason = rejected[0].reason
+        await db.rollback()
+        if reason == BulkRejectReason.NOT_FOUND:
+            raise HTTPException(status_code=404, detail="Textbook not found")
+        detail = {
+            BulkRejectReason.INACTIVE: "Textbook is not active",
+            BulkRejectReason.NOT_ISSUED: "Textbook is not issued",
+            BulkRejectReason.SAME_STUDENT: "Textbook is already issued to this student"
+        }[reason]
+        raise HTTPException(status_code=400, detail=detail)
+    
+    transfer = transfers[0]
+    await db.commit()
+    await report_cache.invalidate_students(db, [transfer.from_student_id, transfer.to_student_id])
+    
+    await notify_transfer(db, transfer.to_student_id, transfers)
+    
+    return transfer
+
+
+@router.post("/bulk-transfer", response_model=BulkTransferResponse)
+async def bulk_transfer_textbooks(
+    request: BulkTransferRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """Массовая передача учебников ученику (например, от старшего брата или сестры)"""
+    student = await get_transfer_recipient(db, request.to_student_id)
+    transfers, rejected = await transfer_loans(
+        db, request.textbook_ids, student, current_user.id, request.notes
+    )
+    
+    await db.commit()
+    if transfers:
+        await report_cache.invalidate_students(
+            db, [request.to_student_id] + [transfer.from_student_id for transfer in transfers]
+        )
+    
+    await notify_transfer(db, request.to_student_id, transfers)
+    
+    return BulkTransferResponse(transfers=transfers, rejected=rejected)
+
+
+@router.post("/scan-batch", response_model=ScanBatchResponse)
+async def ingest_scan_batch(
+    request: ScanBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_teacher)
+):
+    """Загрузка пачки сканирований, накопленных станцией без сети (повторная отправка безопасна)"""
+    try:
+        results, student_ids = await ScanIngest(db).ingest(request.events, current_user.id)
+        await db.commit()
+    except LoanConflict:
+        # Экземпляры пачки одновременно выдали или приняли с другой станции
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Textbooks were issued or returned concurrently, retry the upload")
+    except IntegrityError:
+        # Та же пачка одновременно загружается другим запросом (client_event_id)
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Scan events are being processed, retry the upload")
+    
+    await report_cache.invalidate_students(db, student_ids)
+    
+    results = [ScanEventResult(**result) for result in results]
+    return ScanBatchResponse(
+        applied=sum(result.status == ScanStatus.APPLIED and not result.duplicate for result in results),
+        rejected=sum(result.status == ScanStatus.REJECTED and not result.duplicate for result in results),
+        duplicates=sum(result.duplicate for result in results),
+        results=results
+    )
+
+
+TRANSACTION_LIST_COLUMNS = [
+    "id", "textbook_title", "student_name", "transaction_type", "status", "issued_at", "returned_at"
+]
+
+
+def transaction_list_row(row) -> tuple:
+    """Строка проекции журнала -> значения колонок TRANSACTION_LIST_COLUMNS"""
+    transaction_id, title, last_name, first_name, middle_name, *transaction_row = row
+    student_name = " ".join(part for part in (last_name, first_name, middle_name) if part)
+    return (transaction_id, title, student_name, *transaction_row)
 
 
 @router.get("/", response_model=List[TransactionList])
 async def get_transactions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     student_id: Optional[int] = None,
     textbook_id: Optional[int] = None,
     transaction_type: Optional[TransactionType] = None,
     status: Optional[TransactionStatus] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
-    """Получение списка транзакций с фильтрацией"""
-    query = db.query(Transaction)
+    """Получение списка транзакций с фильтрацией (format=csv|xlsx - выгрузка всего журнала)"""
+    # Проекция: только колонки списка, название и ученик берутся join'ом в том же запросе
+    query = select(
+        Transaction.id, Textbook.title, Student.last_name, Student.first_name, Student.middle_name,
+        Transaction.transaction_type, Transaction.status, Transaction.issued_at, Transaction.returned_at
+    ).join(
+        Textbook, Textbook.id == Transaction.textbook_id
+    ).join(
+        Student, Student.id == Transaction.student_id
+    )
     
     if student_id:
         query = query.filter(Transaction.student_id == student_id)
@@ -286,18 +748,30 @@ async def get_transactions(
     if status:
         query = query.filter(Transaction.status == status)
     
-    transactions = query.offset(skip).limit(limit).all()
-    return transactions
+    if export_format:
+        return export_response(
+            "transactions",
+            TRANSACTION_LIST_COLUMNS,
+            (transaction_list_row(row) async for row in stream_rows(db, query.order_by(Transaction.id))),
+            export_format
+        )
+    
+    rows, next_cursor = await KeysetPage(db, Transaction).fetch(query, cursor, skip, limit)
+    set_next_cursor(response, next_cursor)
+    return [
+        TransactionList(**dict(zip(TRANSACTION_LIST_COLUMNS, transaction_list_row(row))))
+        for row in rows
+    ]
 
 
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(
     transaction_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение конкретной транзакции"""
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    transaction = await db.get(Transaction, transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     return transaction
@@ -306,28 +780,14 @@ async def get_transaction(
 @router.get("/student/{student_id}/active", response_model=List[TransactionResponse])
 async def get_student_active_textbooks(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение активных учебников ученика (выданных, но не возвращенных)"""
-    # Находим все выданные учебники ученика
-    issued_transactions = db.query(Transaction).filter(
-        Transaction.student_id == student_id,
-        Transaction.transaction_type == TransactionType.ISSUE,
-        Transaction.status == TransactionStatus.COMPLETED
-    ).all()
-    
-    active_textbooks = []
-    
-    for issue_transaction in issued_transactions:
-        # Проверяем, есть ли возврат для этого учебника
-        return_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == issue_transaction.textbook_id,
-            Transaction.transaction_type == TransactionType.RETURN,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
-        
-        if not return_transaction:
-            active_textbooks.append(issue_transaction)
+    active_transactions = (await db.scalars(select(Transaction).join(
+        ActiveLoan, ActiveLoan.transaction_id == Transaction.id
+    ).where(
+        ActiveLoan.student_id == student_id
+    ))).all()
     
-    return active_textbooks 
\ No newline at end of file
+    return active_transactions 
\ No newline at end of file
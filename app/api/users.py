@@ -1,26 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User, UserRole
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
 from app.api.auth import get_current_teacher, get_password_hash
+from app.services.pagination import KeysetPage, set_next_cursor
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     role: Optional[UserRole] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение списка пользователей с фильтрацией"""
-    query = db.query(User)
+    query = select(User)
     
     if role:
         query = query.filter(User.role == role)
@@ -28,18 +32,19 @@ async def get_users(
     if is_active is not None:
         query = query.filter(User.is_active == is_active)
     
-    users = query.offset(skip).limit(limit).all()
+    users, next_cursor = await KeysetPage(db, User).fetch(query, cursor, skip, limit)
+    set_next_cursor(response, next_cursor)
     return users
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение конкретного пользователя"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -49,11 +54,11 @@ async def get_user(
 async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Обновление данных пользователя"""
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -62,28 +67,28 @@ async def update_user(
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Удаление пользователя (мягкое удаление - деактивация)"""
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Мягкое удаление - деактивируем пользователя
     db_user.is_active = False
-    db.commit()
+    await db.commit()
     
     return {"message": "User deactivated successfully"}
 
@@ -91,41 +96,41 @@ async def delete_user(
 @router.post("/{user_id}/activate")
 async def activate_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Активация пользователя"""
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
     db_user.is_active = True
-    db.commit()
+    await db.commit()
     
     return {"message": "User activated successfully"}
 
 
 @router.get("/students", response_model=List[UserResponse])
 async def get_student_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение всех пользователей-учеников"""
-    student_users = db.query(User).filter(
+    student_users = (await db.scalars(select(User).where(
         User.role == UserRole.STUDENT,
         User.is_active == True
-    ).all()
+    ))).all()
     return student_users
 
 
 @router.get("/teachers", response_model=List[UserResponse])
 async def get_teacher_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_teacher)
 ):
     """Получение всех пользователей-учителей"""
-    teacher_users = db.query(User).filter(
+    teacher_users = (await db.scalars(select(User).where(
         User.role == UserRole.TEACHER,
         User.is_active == True
-    ).all()
+    ))).all()
     return teacher_users 
\ No newline at end of file
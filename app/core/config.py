@@ -6,6 +6,45 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./textbook_management.db"
+    # Логирование SQL (каждый запрос пишется в stdout) - только для отладки
+    DATABASE_ECHO: bool = False
+    # Пул соединений: постоянные соединения и дополнительные при пиковой нагрузке
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    # Серверные БД (PostgreSQL): проверка соединения перед выдачей из пула и
+    # пересоздание соединений старше заданного числа секунд (разрывы по таймауту сервера)
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_POOL_RECYCLE: int = 1800
+    # Движок чтения для GET отчетов и списков: URL реплики PostgreSQL.
+    # Если не задан, для файла SQLite открывается второе соединение mode=ro
+    # (SQLITE_READ_ONLY_ENGINE), иначе чтение идет через основной движок
+    DATABASE_READ_URL: Optional[str] = None
+    # Срок жизни кэша отчетов при реплике: отчет, посчитанный по отстающей
+    # реплике сразу после записи, живет в кэше не дольше этого числа секунд
+    REPLICA_REPORT_CACHE_SECONDS: int = 30
+    SQLITE_READ_ONLY_ENGINE: bool = True
+    
+    # Учет SQL-запросов каждого HTTP-запроса (заголовок Server-Timing, debug-лог).
+    # Бюджет - предупреждение при превышении числа запросов (0 - без бюджета),
+    # в strict-режиме превышение возвращает ошибку (для проверок и отладки)
+    SQL_INSTRUMENTATION: bool = True
+    SQL_QUERY_BUDGET: int = 25
+    SQL_QUERY_BUDGET_STRICT: bool = False
+    SQL_REPEATED_QUERY_THRESHOLD: int = 3
+    
+    # Метрики в формате Prometheus на /metrics (счетчики в памяти процесса)
+    METRICS_ENABLED: bool = True
+    
+    # SQLite: PRAGMA, применяемые к каждому новому соединению.
+    # WAL позволяет читать во время записи, synchronous=NORMAL в режиме WAL
+    # не теряет целостность при сбое процесса (только последние коммиты при сбое ОС)
+    SQLITE_PRODUCTION_PROFILE: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = -64000  # Отрицательное значение - размер в КиБ (64 МБ)
+    SQLITE_TEMP_STORE: str = "MEMORY"
     
     # JWT
     SECRET_KEY: str = "your-secret-key-change-in-production"
@@ -20,6 +59,12 @@ class Settings(BaseSettings):
     # Damage Check Period
     DAMAGE_CHECK_DAYS: int = 7
     
+    # Loan Period: выдача старше этого срока считается просроченной
+    LOAN_PERIOD_DAYS: int = 365
+    
+    # Dashboard: время жизни кэша счетчиков в секундах
+    DASHBOARD_CACHE_SECONDS: int = 30
+    
     # File Storage
     STATIC_DIR: str = "static"
     QR_CODES_DIR: str = "static/qr_codes"
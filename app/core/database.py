@@ -1,31 +1,148 @@
-from sqlalchemy import create_engine
+from pathlib import Path
+from typing import Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.query_stats import instrument_engine
 
-# Синхронный движок для SQLite
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False}  # Для SQLite
+# Асинхронные драйверы для DATABASE_URL с синхронным драйвером
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL с асинхронным драйвером (aiosqlite, asyncpg)"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver and url.drivername != driver:
+        url = url.set(drivername=driver)
+    return url.render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> Dict:
+    """Параметры движка для DATABASE_URL: логирование SQL, пул и аргументы драйвера"""
+    url = make_url(url)
+    options = {"echo": settings.DATABASE_ECHO}
+    if url.get_backend_name() == "sqlite":
+        if url.drivername == "sqlite":
+            # Соединение из пула может использоваться в другом потоке (threadpool FastAPI)
+            options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # База в памяти живет в одном соединении, пул у нее свой
+            return options
+    else:
+        options["pool_pre_ping"] = settings.DATABASE_POOL_PRE_PING
+        options["pool_recycle"] = settings.DATABASE_POOL_RECYCLE
+    options["pool_size"] = settings.DATABASE_POOL_SIZE
+    options["max_overflow"] = settings.DATABASE_MAX_OVERFLOW
+    return options
+
+
+def read_database_url() -> Optional[str]:
+    """
+    URL движка чтения: реплика DATABASE_READ_URL или тот же файл SQLite в режиме mode=ro.
+    None - отдельного движка нет, чтение идет через основной.
+    """
+    if settings.DATABASE_READ_URL:
+        return settings.DATABASE_READ_URL
+    url = make_url(settings.DATABASE_URL)
+    if (not settings.SQLITE_READ_ONLY_ENGINE or url.get_backend_name() != "sqlite"
+            or url.database in (None, "", ":memory:")):
+        return None
+    url = url.set(
+        database=Path(url.database).resolve().as_uri(),
+        query={"mode": "ro", "uri": "true"}
+    )
+    return url.render_as_string(hide_password=False)
+
+
+def sqlite_pragmas() -> Dict[str, object]:
+    """PRAGMA производственного профиля SQLite из настроек"""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": settings.SQLITE_TEMP_STORE,
+    }
+
+
+def enable_sqlite_pragmas(engine: Engine, pragmas: Dict[str, object]) -> None:
+    """Применяет PRAGMA к каждому новому соединению движка (для async - engine.sync_engine)"""
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+# Синхронный движок: создание таблиц, миграции, скрипты
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+
+# Асинхронный движок для обработчиков запросов: ожидание БД не блокирует event loop
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **engine_options(async_database_url(settings.DATABASE_URL))
 )
 
-# Фабрика сессий
+if settings.SQLITE_PRODUCTION_PROFILE and engine.dialect.name == "sqlite":
+    enable_sqlite_pragmas(engine, sqlite_pragmas())
+    enable_sqlite_pragmas(async_engine.sync_engine, sqlite_pragmas())
+
+# Движок чтения для GET отчетов и списков со своим пулом: долгие отчеты
+# не занимают соединения основного движка, через который идут выдача и возврат
+READ_DATABASE_URL = read_database_url()
+if READ_DATABASE_URL:
+    read_async_engine = create_async_engine(
+        async_database_url(READ_DATABASE_URL),
+        **engine_options(async_database_url(READ_DATABASE_URL))
+    )
+    if settings.SQLITE_PRODUCTION_PROFILE and read_async_engine.dialect.name == "sqlite":
+        # Режим журнала задает основной движок, соединение mode=ro его не меняет
+        read_pragmas = {name: value for name, value in sqlite_pragmas().items()
+                        if name != "journal_mode"}
+        enable_sqlite_pragmas(read_async_engine.sync_engine, read_pragmas)
+else:
+    read_async_engine = async_engine
+
+if settings.SQL_INSTRUMENTATION:
+    instrument_engine(async_engine.sync_engine)
+    if read_async_engine is not async_engine:
+        instrument_engine(read_async_engine.sync_engine)
+
+# Фабрики сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: после коммита атрибуты читаются без неявного запроса
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(read_async_engine, autoflush=False, expire_on_commit=False)
 
 # Базовая модель
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency для получения сессии БД"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency для получения асинхронной сессии БД"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    """
+    Dependency для сессии только на чтение (реплика или SQLite mode=ro).
+    Реплика может отставать от основной БД, поэтому обработчики, которые
+    читают только что записанные данные, используют get_db.
+    """
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 def create_tables():
     """Создание всех таблиц"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
@@ -0,0 +1,221 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.query_stats import current_query_stats
+
+# Content-Type текстового формата Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы гистограмм по умолчанию (секунды), как в клиентах Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Метрика с метками: значения хранятся по кортежу значений меток"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    """Счетчик, который только растет (количество запросов, ошибок)"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    """Гистограмма: количество наблюдений по границам buckets, сумма и общее число"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # По ключу: число наблюдений в каждом интервале (последний - выше всех границ) и сумма
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в памяти и их вывод в текстовом формате Prometheus.
+
+    Как и кэш отчетов, метрики хранятся в памяти процесса: при нескольких
+    воркерах у каждого свои счетчики, и Prometheus должен опрашивать каждый.
+    """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+http_requests_total = metrics.counter(
+    "http_requests_total", "Количество HTTP-запросов", ("method", "route", "status")
+)
+http_request_duration_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Длительность HTTP-запросов", ("method", "route")
+)
+db_queries_total = metrics.counter(
+    "db_queries_total", "Количество SQL-запросов по маршрутам API", ("method", "route")
+)
+db_request_duration_seconds = metrics.histogram(
+    "db_request_duration_seconds", "Время SQL-запросов одного HTTP-запроса", ("method", "route")
+)
+max_bot_request_duration_seconds = metrics.histogram(
+    "max_bot_request_duration_seconds", "Длительность запросов к API МАКС", ("method", "endpoint")
+)
+max_bot_request_errors_total = metrics.counter(
+    "max_bot_request_errors_total", "Ошибки запросов к API МАКС (сеть или статус >= 400)", ("method", "endpoint")
+)
+image_upload_bytes = metrics.histogram(
+    "image_upload_bytes", "Размер загруженных изображений",
+    buckets=(16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 10 * 1024 * 1024)
+)
+image_upload_duration_seconds = metrics.histogram(
+    "image_upload_duration_seconds", "Длительность сохранения загруженных изображений"
+)
+qr_generation_duration_seconds = metrics.histogram(
+    "qr_generation_duration_seconds", "Длительность генерации QR-кода"
+)
+
+
+def route_label(scope) -> str:
+    """Шаблон маршрута (/api/students/{student_id}), чтобы id не плодили метки"""
+    if "route" not in scope:
+        if "endpoint" in scope:
+            # Смонтированное приложение (/static): файлы не выделяются в отдельные метки
+            return scope.get("root_path", "") + "/{path}"
+        return "unmatched"
+    # FastAPI с подключаемыми роутерами без копирования маршрутов кладет в scope
+    # маршрут с префиксом роутера; в scope["route"] тогда шаблон без префикса
+    route = scope.get("fastapi", {}).get("effective_route_context") or scope["route"]
+    return getattr(route, "path_format", None) or scope["route"].path
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: количество и длительность HTTP-запросов по маршрутам.
+
+    Подключается внутри QueryStatsMiddleware, чтобы взять SQL-запросы
+    текущего HTTP-запроса. Длительность потоковых ответов включает отправку тела.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status: Optional[int] = None
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            method = scope["method"]
+            route = route_label(scope)
+            http_request_duration_seconds.observe(time.perf_counter() - started_at, method=method, route=route)
+            http_requests_total.inc(method=method, route=route, status=status or 500)
+
+            stats = current_query_stats()
+            if stats is not None:
+                db_queries_total.inc(stats.count, method=method, route=route)
+                db_request_duration_seconds.observe(stats.duration, method=method, route=route)
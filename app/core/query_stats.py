@@ -0,0 +1,157 @@
+import contextlib
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# Литералы и параметры всех драйверов (?, $1, %(name)s, :name) заменяются на ?,
+# списки IN (...) и VALUES сворачиваются, чтобы запросы в цикле совпадали
+_FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\?(?:\s*,\s*\?)+"), "?"),
+    (re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+"), "(?)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(statement: str) -> str:
+    """Текст запроса без значений параметров: одинаков для запросов в цикле"""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """HTTP-запрос выполнил больше SQL-запросов, чем разрешено бюджетом"""
+
+
+class QueryStats:
+    """
+    SQL-запросы одного HTTP-запроса: количество, время в БД и повторы.
+
+    Повтор одного и того же запроса (с разными параметрами) - признак
+    запроса в цикле по строкам (N+1), который стоит заменить одним запросом.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, выполненные не меньше threshold раз, от частых к редким"""
+        return [(statement, count) for statement, count in self.fingerprints.most_common()
+                if count >= threshold]
+
+    def server_timing(self, threshold: int) -> str:
+        """Значение заголовка Server-Timing (время в миллисекундах)"""
+        value = f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+        repeated = self.repeated(threshold)
+        if repeated:
+            value += f', db-repeated;desc="{len(repeated)} statements, up to {repeated[0][1]}x"'
+        return value
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Счетчики текущего HTTP-запроса (или блока track_queries), None вне их"""
+    return _current_stats.get()
+
+
+@contextlib.contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Считает SQL-запросы инструментированных движков внутри блока"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Подключает учет запросов к движку (для async - engine.sync_engine).
+    Вне track_queries обработчики событий ничего не делают.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _current_stats.get() is not None:
+            context.query_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        started_at = getattr(context, "query_started_at", None)
+        if stats is not None and started_at is not None:
+            stats.record(statement, time.perf_counter() - started_at)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware: учет SQL-запросов каждого HTTP-запроса.
+
+    Итог добавляется в заголовок Server-Timing и пишется в debug-лог вместе
+    с повторяющимися запросами. При превышении budget (0 - без бюджета)
+    пишется предупреждение, а в strict-режиме ответ заменяется ошибкой
+    QueryBudgetExceeded - так проверки падают на endpoint'ах с N+1.
+    Запросы потоковых выгрузок после отправки заголовков попадают только в лог.
+    """
+
+    def __init__(self, app, budget: int = 0, strict: bool = False, repeated_threshold: int = 3):
+        self.app = app
+        self.budget = budget
+        self.strict = strict
+        self.repeated_threshold = repeated_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_name = f"{scope['method']} {scope['path']}"
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                self.check_budget(request_name, stats)
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(self.repeated_threshold))
+            await send(message)
+
+        with track_queries() as stats:
+            try:
+                await self.app(scope, receive, send_with_stats)
+            finally:
+                self.log(request_name, stats)
+
+    def check_budget(self, request_name: str, stats: QueryStats) -> None:
+        if not self.budget or stats.count <= self.budget:
+            return
+        message = f"{request_name}: {stats.count} SQL-запросов при бюджете {self.budget}"
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    def log(self, request_name: str, stats: QueryStats) -> None:
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("%s: %d SQL-запросов, %.1f мс в БД",
+                     request_name, stats.count, stats.duration * 1000)
+        for statement, count in stats.repeated(self.repeated_threshold):
+            logger.debug("  повтор %dx: %s", count, statement)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class ActiveLoan(Base):
+    """Текущая выдача экземпляра: одна строка на каждый учебник, находящийся на руках"""
+    __tablename__ = "active_loans"
+
+    textbook_id = Column(Integer, ForeignKey("textbooks.id"), primary_key=True)  # Один экземпляр - одна выдача
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False, unique=True)  # Транзакция выдачи
+    issued_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ActiveLoan(textbook_id={self.textbook_id}, student_id={self.student_id})>"
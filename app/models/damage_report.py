@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -18,6 +18,11 @@ class DamageStatus(str, enum.Enum):
 
 class DamageReport(Base):
     __tablename__ = "damage_reports"
+    __table_args__ = (
+        Index("ix_damage_reports_status_reported_at", "status", "reported_at"),
+        Index("ix_damage_reports_textbook_reported_by", "textbook_id", "reported_by"),
+        Index("ix_damage_reports_created_at_id", "created_at", "id"),  # Порядок страниц списка
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     textbook_id = Column(Integer, ForeignKey("textbooks.id"), nullable=False)
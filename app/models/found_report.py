@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -11,6 +11,9 @@ class FoundStatus(str, enum.Enum):
 
 class FoundReport(Base):
     __tablename__ = "found_reports"
+    __table_args__ = (
+        Index("ix_found_reports_created_at_id", "created_at", "id"),  # Порядок страниц списка
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     textbook_id = Column(Integer, ForeignKey("textbooks.id"), nullable=False)
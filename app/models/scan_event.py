@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+from app.models.transaction import TransactionType
+import enum
+
+
+class ScanStatus(str, enum.Enum):
+    APPLIED = "applied"      # Применено: создана транзакция
+    REJECTED = "rejected"    # Отклонено, причина в reason
+
+
+class ScanEvent(Base):
+    """Событие сканирования QR со станции: журнал для дедупликации повторных загрузок"""
+    __tablename__ = "scan_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    client_event_id = Column(String, unique=True, index=True, nullable=False)  # Id события на станции
+    qr_code = Column(String, nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=True)
+    # Не нативный enum: тип transactiontype в PostgreSQL принадлежит таблице transactions
+    action = Column(Enum(TransactionType, native_enum=False), nullable=False)
+    client_timestamp = Column(DateTime(timezone=True), nullable=False)  # Время сканирования на станции
+    
+    status = Column(Enum(ScanStatus, native_enum=False), nullable=False)
+    reason = Column(String, nullable=True)  # Причина отказа (BulkRejectReason)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=True)
+    
+    received_by = Column(Integer, ForeignKey("users.id"), nullable=False)  # Кто загрузил пачку
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<ScanEvent(client_event_id='{self.client_event_id}', status='{self.status}')>"
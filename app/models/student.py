@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        Index("ix_students_grade_is_active", "grade", "is_active"),
+        Index("ix_students_created_at_id", "created_at", "id"),  # Порядок страниц списка
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, nullable=False)
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Integer as SqlInteger, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, Integer as SqlInteger, DateTime, Text, Boolean, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 
 class Textbook(Base):
     __tablename__ = "textbooks"
+    __table_args__ = (
+        Index("ix_textbooks_created_at_id", "created_at", "id"),  # Порядок страниц списка
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     qr_code = Column(String, unique=True, index=True, nullable=False)  # Уникальный QR код
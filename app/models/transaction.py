@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Enum, DateTime, Text, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -19,6 +19,11 @@ class TransactionStatus(str, enum.Enum):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_textbook_type_status", "textbook_id", "transaction_type", "status"),
+        Index("ix_transactions_student_type_status", "student_id", "transaction_type", "status"),
+        Index("ix_transactions_created_at_id", "created_at", "id"),  # Порядок страниц списка
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     textbook_id = Column(Integer, ForeignKey("textbooks.id"), nullable=False)
@@ -36,6 +41,9 @@ class Transaction(Base):
     issued_at = Column(DateTime(timezone=True), server_default=func.now())
     returned_at = Column(DateTime(timezone=True), nullable=True)
     
+    # Для возврата: транзакция выдачи, которую он закрывает
+    issue_transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=True, index=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
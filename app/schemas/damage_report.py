@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from app.models.damage_report import DamageType, DamageStatus
+from app.schemas.photos import PhotoList
 
 
 class DamageReportBase(BaseModel):
@@ -24,7 +25,7 @@ class DamageReportUpdate(BaseModel):
 class DamageReportResponse(DamageReportBase):
     id: int
     reported_by: int
-    photos: Optional[List[str]] = None
+    photos: PhotoList = None
     status: DamageStatus
     decision: Optional[str] = None
     checked_by: Optional[int] = None
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from app.models.found_report import FoundStatus
+from app.schemas.photos import PhotoList
 
 
 class FoundReportBase(BaseModel):
@@ -24,7 +25,7 @@ class FoundReportUpdate(BaseModel):
 class FoundReportResponse(FoundReportBase):
     id: int
     reported_by: int
-    photos: Optional[List[str]] = None
+    photos: PhotoList = None
     status: FoundStatus
     notes: Optional[str] = None
     returned_by: Optional[int] = None
@@ -0,0 +1,14 @@
+import json
+from typing import Annotated, List, Optional
+from pydantic import BeforeValidator
+
+
+def parse_photos(value):
+    """Пути к фото из колонки photos (JSON строка) или готовый список"""
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return value
+
+
+# Поле ответа со списком фото, которые в БД хранятся JSON строкой
+PhotoList = Annotated[Optional[List[str]], BeforeValidator(parse_photos)]
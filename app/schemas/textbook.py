@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 
@@ -65,4 +65,26 @@ class TextbookBulkCreate(BaseModel):
     isbn: Optional[str] = Field(None, pattern=r'^[\d-]{10,17}$')
     inventory_number_prefix: Optional[str] = Field(None, max_length=20)
     quantity: int = Field(..., ge=1, le=1000)
-    initial_condition: Optional[str] = Field(None, max_length=1000) 
\ No newline at end of file
+    initial_condition: Optional[str] = Field(None, max_length=1000)
+
+
+class TextbookHolder(BaseModel):
+    student_id: int
+    full_name: str
+    grade: Optional[str] = None
+    issued_at: Optional[datetime] = None
+    transaction_id: int  # Транзакция выдачи
+
+
+class QRResolveRequest(BaseModel):
+    qr_codes: List[str] = Field(..., min_items=1, max_items=500)
+
+
+class QRResolvedTextbook(TextbookList):
+    available: bool  # Активен и не выдан
+    holder: Optional[TextbookHolder] = None  # У кого экземпляр на руках
+
+
+class QRResolveResponse(BaseModel):
+    textbooks: List[QRResolvedTextbook]  # В порядке кодов запроса, без повторов
+    not_found: List[str] = []            # Коды, которых нет в базе
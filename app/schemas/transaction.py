@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
+from app.schemas.photos import PhotoList
 
 
 class TransactionType(str, Enum):
@@ -35,10 +36,11 @@ class TransactionUpdate(BaseModel):
 class TransactionResponse(TransactionBase):
     id: int
     status: TransactionStatus
-    photos: Optional[List[str]] = None
+    photos: PhotoList = None
     issued_by: int  # ID учителя
     issued_at: datetime
     returned_at: Optional[datetime] = None
+    issue_transaction_id: Optional[int] = None  # Для возврата: закрываемая выдача
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -59,6 +61,22 @@ class TransactionList(BaseModel):
         from_attributes = True
 
 
+class BulkRejectReason(str, Enum):
+    NOT_FOUND = "not_found"            # Учебник не существует
+    INACTIVE = "inactive"              # Учебник списан
+    ALREADY_ISSUED = "already_issued"  # Учебник уже на руках
+    NOT_ISSUED = "not_issued"          # Учебник не выдан (для возврата)
+    DUPLICATE = "duplicate"            # Повтор id в запросе
+    STUDENT_NOT_FOUND = "student_not_found"  # Ученик не существует (для выдачи)
+    STUDENT_INACTIVE = "student_inactive"    # Ученик не активен (для выдачи)
+    SAME_STUDENT = "same_student"      # Учебник уже у получателя (для передачи)
+
+
+class BulkRejection(BaseModel):
+    textbook_id: int
+    reason: BulkRejectReason
+
+
 class BulkIssueRequest(BaseModel):
     textbook_ids: List[int] = Field(..., min_items=1)
     student_id: int
@@ -67,4 +85,103 @@ class BulkIssueRequest(BaseModel):
 
 class BulkReturnRequest(BaseModel):
     textbook_ids: List[int] = Field(..., min_items=1)
-    notes: Optional[str] = Field(None, max_length=500) 
\ No newline at end of file
+    notes: Optional[str] = Field(None, max_length=500) 
+
+
+class TransferRequest(BaseModel):
+    textbook_id: int
+    to_student_id: int  # Кому передается экземпляр
+    notes: Optional[str] = Field(None, max_length=500)
+
+
+class BulkTransferRequest(BaseModel):
+    textbook_ids: List[int] = Field(..., min_items=1)
+    to_student_id: int
+    notes: Optional[str] = Field(None, max_length=500)
+
+
+class TransferResult(BaseModel):
+    textbook_id: int
+    from_student_id: int
+    to_student_id: int
+    return_transaction_id: int  # Возврат от прежнего владельца
+    issue_transaction_id: int   # Выдача новому владельцу
+
+
+class BulkTransferResponse(BaseModel):
+    transfers: List[TransferResult]
+    rejected: List[BulkRejection] = []
+
+
+class BulkTransactionResponse(BaseModel):
+    transactions: List[TransactionResponse]  # Созданные транзакции
+    rejected: List[BulkRejection] = []       # Отклоненные id с причиной
+
+
+class ClassIssueRequest(BaseModel):
+    grade: str = Field(..., pattern=r'^\d{1,2}[А-Я]$')  # Например: 7А
+    # Комплект задается одним из способов: названия, предметы или конкретные экземпляры
+    titles: Optional[List[str]] = Field(None, min_items=1)
+    subjects: Optional[List[str]] = Field(None, min_items=1)
+    textbook_ids: Optional[List[int]] = Field(None, min_items=1)
+    notes: Optional[str] = Field(None, max_length=500)
+
+
+class ClassIssueCopy(BaseModel):
+    transaction_id: int
+    textbook_id: int
+    qr_code: str
+    subject: str
+    title: str
+
+
+class ClassIssueStudent(BaseModel):
+    student_id: int
+    full_name: str
+    textbooks: List[ClassIssueCopy] = []
+
+
+class ClassIssueShortage(BaseModel):
+    subject: Optional[str] = None
+    title: Optional[str] = None
+    missing: int  # Скольким ученикам не хватило свободных экземпляров
+
+
+class ClassIssueResponse(BaseModel):
+    grade: str
+    issued_count: int
+    manifest: List[ClassIssueStudent]         # Кто какой экземпляр получил
+    shortages: List[ClassIssueShortage] = []  # Названия, которых не хватило
+    rejected: List[BulkRejection] = []        # Отклоненные textbook_ids с причиной
+
+
+class ScanStatus(str, Enum):
+    APPLIED = "applied"
+    REJECTED = "rejected"
+
+
+class ScanEventIn(BaseModel):
+    client_event_id: str = Field(..., min_length=1, max_length=100)  # Уникальный id события на станции
+    qr_code: str
+    student_id: Optional[int] = None  # Обязателен для выдачи
+    action: TransactionType
+    client_timestamp: datetime  # Время сканирования на станции
+
+
+class ScanBatchRequest(BaseModel):
+    events: List[ScanEventIn] = Field(..., min_items=1)
+
+
+class ScanEventResult(BaseModel):
+    client_event_id: str
+    status: ScanStatus
+    reason: Optional[BulkRejectReason] = None
+    transaction_id: Optional[int] = None
+    duplicate: bool = False  # Событие уже было загружено, повторно не применялось
+
+
+class ScanBatchResponse(BaseModel):
+    applied: int
+    rejected: int
+    duplicates: int
+    results: List[ScanEventResult]  # В порядке событий запроса
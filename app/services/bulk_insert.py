@@ -0,0 +1,42 @@
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Диалекты, которые возвращают RETURNING в порядке параметров одним запросом
+ORDERED_RETURNING_DIALECTS = {"postgresql"}
+
+
+async def insert_returning(db: AsyncSession, model, rows: List[Dict], key: str) -> List:
+    """
+    Вставляет строки пачкой INSERT ... RETURNING, объекты моделей в порядке rows.
+
+    PostgreSQL сортирует RETURNING по порядку параметров (sort_by_parameter_order)
+    в одном многострочном INSERT. В SQLite такая сортировка выполняется вставкой
+    по одной строке, поэтому строки делятся на пачки, в которых значение key
+    уникально, и результат сопоставляется по нему.
+    """
+    if not rows:
+        return []
+
+    if db.get_bind().dialect.name in ORDERED_RETURNING_DIALECTS:
+        return list(await db.scalars(
+            insert(model).returning(model, sort_by_parameter_order=True), rows
+        ))
+
+    batches = []
+    for index, row in enumerate(rows):
+        for batch in batches:
+            if row[key] not in batch:
+                batch[row[key]] = index
+                break
+        else:
+            batches.append({row[key]: index})
+
+    objects = [None] * len(rows)
+    for batch in batches:
+        for obj in await db.scalars(
+            insert(model).returning(model), [rows[index] for index in batch.values()]
+        ):
+            objects[batch[getattr(obj, key)]] = obj
+    return objects
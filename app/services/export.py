@@ -0,0 +1,198 @@
+import csv
+import enum
+import io
+import zipfile
+from datetime import date, datetime
+from typing import Any, AsyncIterable, AsyncIterator, List, Sequence
+from xml.sax.saxutils import escape
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Строк в одной пачке: столько строк читается из курсора и отправляется клиенту за раз
+EXPORT_BATCH_SIZE = 500
+
+
+class ExportFormat(str, enum.Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_response(
+    name: str,
+    columns: Sequence[str],
+    rows: AsyncIterable[Sequence[Any]],
+    export_format: ExportFormat
+) -> StreamingResponse:
+    """
+    Потоковая выгрузка строк в CSV или XLSX.
+
+    rows - ленивый асинхронный итератор (обычно поверх AsyncSession.stream), поэтому
+    файл отправляется по мере чтения курсора и не собирается целиком в памяти.
+    Сессия из get_db/get_read_db читается уже после выхода из endpoint'а: нужен
+    FastAPI 0.118+, который закрывает yield-зависимости после отправки ответа.
+    """
+    if export_format == ExportFormat.XLSX:
+        chunks = _xlsx_chunks(columns, rows)
+    else:
+        chunks = _csv_chunks(columns, rows)
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'}
+    )
+
+
+async def stream_rows(db: AsyncSession, query: Select) -> AsyncIterator[Row]:
+    """Строки запроса через серверный курсор, по EXPORT_BATCH_SIZE строк за чтение"""
+    result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for row in result:
+        yield row
+
+
+async def stream_scalars(db: AsyncSession, query: Select) -> AsyncIterator[Any]:
+    """Объекты запроса одной модели через серверный курсор"""
+    result = await db.stream_scalars(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for item in result:
+        yield item
+
+
+def _cell(value: Any) -> Any:
+    """Значение ячейки: Enum -> значение, дата -> ISO строка"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def _csv_chunks(columns: Sequence[str], rows: AsyncIterable[Sequence[Any]]) -> AsyncIterator[bytes]:
+    """CSV пачками строк; BOM нужен Excel, чтобы распознать UTF-8 с кириллицей"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+
+    number = 0
+    async for row in rows:
+        number += 1
+        writer.writerow([_cell(value) for value in row])
+        if number % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Файлоподобный приемник для zipfile: накапливает байты до следующей отдачи"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values: Sequence[Any]) -> str:
+    """Строка листа: числа - числовые ячейки, остальное - встроенные строки"""
+    cells = []
+    for value in values:
+        value = _cell(value)
+        if value is None:
+            cells.append("<c/>")
+        elif isinstance(value, bool):
+            cells.append(f'<c t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+async def _xlsx_chunks(columns: Sequence[str], rows: AsyncIterable[Sequence[Any]]) -> AsyncIterator[bytes]:
+    """
+    XLSX без сторонних библиотек: лист пишется в ZIP поток строка за строкой.
+
+    zipfile умеет писать в поток без seek (с дескрипторами данных), поэтому
+    архив отдается клиенту по частям, пока курсор еще читается.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for part, content in _XLSX_PARTS.items():
+            archive.writestr(part, content)
+        yield sink.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(columns)
+            ).encode("utf-8"))
+
+            number = 0
+            async for row in rows:
+                number += 1
+                sheet.write(_xlsx_row(row).encode("utf-8"))
+                if number % EXPORT_BATCH_SIZE == 0:
+                    yield sink.drain()
+
+            sheet.write(b"</sheetData></worksheet>")
+
+    yield sink.drain()
@@ -1,8 +1,10 @@
 import os
+import time
 import aiofiles
 from fastapi import UploadFile, HTTPException
 from typing import List
 from app.core.config import settings
+from app.core.metrics import image_upload_bytes, image_upload_duration_seconds
 import uuid
 
 
@@ -26,6 +28,7 @@ class ImageStorage:
         file_size = 0
         
         # Читаем файл и сохраняем его
+        started_at = time.perf_counter()
         file_path = os.path.join(self.upload_dir, filename)
         
         async with aiofiles.open(file_path, 'wb') as f:
@@ -38,6 +41,9 @@ class ImageStorage:
                     raise HTTPException(status_code=400, detail="File too large (max 10MB)")
                 await f.write(chunk)
         
+        image_upload_duration_seconds.observe(time.perf_counter() - started_at)
+        image_upload_bytes.observe(file_size)
+        
         # Возвращаем относительный путь для сохранения в БД
         return f"/static/uploads/{filename}"
     
@@ -0,0 +1,92 @@
+from typing import Iterable, List, Optional, Set, Tuple
+from sqlalchemy import delete, insert, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.active_loan import ActiveLoan
+from app.models.transaction import Transaction
+
+
+class LoanConflict(Exception):
+    """Выдачу открыл или закрыл другой запрос между чтением и записью"""
+
+
+class LoanLedger:
+    """
+    Учет текущих выдач.
+
+    Таблица active_loans обновляется в той же транзакции БД, что и журнал
+    transactions, поэтому состояние экземпляра определяется одним запросом
+    по первичному ключу, независимо от длины истории.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_loan(self, textbook_id: int) -> Optional[ActiveLoan]:
+        """Текущая выдача экземпляра или None, если он свободен"""
+        return await self.db.get(ActiveLoan, textbook_id)
+
+    async def open_loan(self, issue_transaction: Transaction) -> ActiveLoan:
+        """Открывает выдачу по транзакции выдачи (без коммита)"""
+        if issue_transaction.id is None:
+            # Нужен id транзакции для ссылки из active_loans
+            await self.db.flush([issue_transaction])
+
+        loan = ActiveLoan(
+            textbook_id=issue_transaction.textbook_id,
+            student_id=issue_transaction.student_id,
+            transaction_id=issue_transaction.id,
+            issued_at=issue_transaction.issued_at
+        )
+        self.db.add(loan)
+        return loan
+
+    async def open_loans(self, issue_transactions: List[Transaction]) -> None:
+        """Открывает выдачи по пачке сохраненных транзакций одним executemany (без коммита).
+
+        LoanConflict - экземпляр уже выдан другим запросом (первичный ключ active_loans).
+        """
+        if not issue_transactions:
+            return
+
+        try:
+            await self.db.execute(insert(ActiveLoan), [
+                {
+                    "textbook_id": transaction.textbook_id,
+                    "student_id": transaction.student_id,
+                    "transaction_id": transaction.id,
+                    "issued_at": transaction.issued_at
+                }
+                for transaction in issue_transactions
+            ])
+        except IntegrityError as error:
+            raise LoanConflict("Textbooks were issued concurrently") from error
+
+    async def close_loan(self, loan: ActiveLoan, return_transaction: Transaction) -> bool:
+        """Закрывает выдачу транзакцией возврата (без коммита).
+
+        False - выдачу уже закрыл одновременный возврат (см. close_loans).
+        """
+        return_transaction.issue_transaction_id = loan.transaction_id
+        return bool(await self.close_loans([(loan.textbook_id, loan.transaction_id)]))
+
+    async def close_loans(self, loans: Iterable[Tuple[int, int]]) -> Set[int]:
+        """Закрывает выдачи по прочитанным ранее парам (textbook_id, transaction_id) (без коммита).
+
+        DELETE условный: строка удаляется, только если это все еще та же выдача,
+        поэтому выдачу, которую тем временем закрыл или открыл заново другой
+        запрос, он не трогает. Возвращает textbook_id закрытых выдач - вызывающий
+        сравнивает их с переданными и не пишет возвраты по остальным.
+        Транзакции возврата ссылаются на закрытые выдачи через issue_transaction_id.
+        """
+        loans = list(loans)
+        if not loans:
+            return set()
+
+        result = await self.db.execute(
+            delete(ActiveLoan).where(
+                tuple_(ActiveLoan.textbook_id, ActiveLoan.transaction_id).in_(loans)
+            ).returning(ActiveLoan.textbook_id)
+        )
+        return set(result.scalars())
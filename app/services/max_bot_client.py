@@ -1,10 +1,19 @@
 import aiohttp
 import json
+import time
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import os
 
 from app.core.config import settings
+from app.core.metrics import max_bot_request_duration_seconds, max_bot_request_errors_total
+
+
+def metrics_endpoint_label(endpoint: str) -> str:
+    """Эндпоинт API без query и id для меток метрик: /chats/{id}/members"""
+    parts = endpoint.split("?")[0].strip("/").split("/")
+    parts[1::2] = ["{id}"] * len(parts[1::2])
+    return "/" + "/".join(parts)
 
 
 class MaxBotClient:
@@ -40,31 +49,38 @@ class MaxBotClient:
         Returns:
             Ответ от API в виде словаря
         """
+        method = method.upper()
+        if method not in ("GET", "POST", "PUT", "DELETE", "PATCH"):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        
         session = await self._get_session()
         url = f"{self.base_url}{endpoint}?access_token={self.bot_token}"
+        # Тело запроса передается только для POST, PUT и PATCH
+        json_data = data if method in ("POST", "PUT", "PATCH") else None
         
+        started_at = time.perf_counter()
+        failed = True
         try:
-            if method.upper() == "GET":
-                async with session.get(url) as response:
-                    return await response.json()
-            elif method.upper() == "POST":
-                async with session.post(url, json=data) as response:
+            async with session.request(method, url, json=json_data) as response:
+                # Статус читается до тела: ошибка прокси может прийти HTML-страницей
+                failed = response.status >= 400
+                try:
                     return await response.json()
-            elif method.upper() == "PUT":
-                async with session.put(url, json=data) as response:
-                    return await response.json()
-            elif method.upper() == "DELETE":
-                async with session.delete(url) as response:
-                    return await response.json()
-            elif method.upper() == "PATCH":
-                async with session.patch(url, json=data) as response:
-                    return await response.json()
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+                except (aiohttp.ContentTypeError, ValueError) as e:
+                    failed = True
+                    return {"error": str(e), "status": response.status}
         
         except aiohttp.ClientError as e:
             # Log error silently for production
             return {"error": str(e)}
+        
+        finally:
+            endpoint_label = metrics_endpoint_label(endpoint)
+            max_bot_request_duration_seconds.observe(
+                time.perf_counter() - started_at, method=method, endpoint=endpoint_label
+            )
+            if failed:
+                max_bot_request_errors_total.inc(method=method, endpoint=endpoint_label)
     
     async def get_bot_info(self) -> Dict[str, Any]:
         """Получение информации о текущем боте"""
@@ -187,6 +203,19 @@ class MaxBotClient:
             message += f"📚 Количество: {kwargs.get('total_count', 0)} учебников\n\n"
             message += f"**Список учебников:**\n{kwargs.get('textbook_list', '')}"
         
+        elif message_type == "transfer_in":
+            message = f"**Передача учебников**\n\n"
+            message += f"👤 Ученик: {student_name}\n"
+            message += f"📚 Получено: {kwargs.get('total_count', 0)} учебников\n\n"
+            message += f"**Список учебников:**\n{kwargs.get('textbook_list', '')}"
+        
+        elif message_type == "transfer_out":
+            message = f"**Передача учебников**\n\n"
+            message += f"👤 Ученик: {student_name}\n"
+            message += f"👥 Передано ученику: {kwargs.get('recipient_name', '')}\n"
+            message += f"📚 Количество: {kwargs.get('total_count', 0)} учебников\n\n"
+            message += f"**Список учебников:**\n{kwargs.get('textbook_list', '')}"
+        
         elif message_type == "lost":
             message = f"**Утеря учебника**\n\n"
             message += f"👤 Ученик: {student_name}\n"
@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, Select, String, literal, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Заголовок ответа с курсором следующей страницы: тело списков остается массивом
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class KeysetPage:
+    """
+    Постраничное чтение списка по ключу (created_at, id).
+
+    Следующая страница начинается условием (created_at, id) > курсор по индексу
+    ix_<таблица>_created_at_id, поэтому страница N стоит столько же, сколько
+    первая, а новые строки попадают в конец списка и не сдвигают уже
+    прочитанные. skip/limit без курсора оставлен для старых клиентов: он
+    использует тот же порядок, но OFFSET по-прежнему читает пропущенные строки.
+    """
+
+    def __init__(self, db: AsyncSession, model):
+        self.db = db
+        self.model = model
+        # В SQLite created_at сравнивается как хранимая строка: колонка остается
+        # голой (индекс работает), а в курсор попадает значение в формате базы
+        self.sqlite = db.get_bind().dialect.name == "sqlite"
+        if self.sqlite:
+            self.created_at = type_coerce(model.created_at, String)
+        else:
+            self.created_at = model.created_at
+
+    async def fetch(
+        self,
+        query: Select,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> Tuple[List[Any], Optional[str]]:
+        """Строки страницы (в форме исходного select) и курсор следующей страницы"""
+        single = len(query.column_descriptions) == 1
+        query = query.add_columns(
+            self.created_at.label("page_created_at"), self.model.id.label("page_id")
+        ).order_by(self.created_at, self.model.id)
+
+        if cursor:
+            created_at, row_id = self._decode(cursor)
+            query = query.where(tuple_(self.created_at, self.model.id) > tuple_(created_at, row_id))
+        elif skip:
+            query = query.offset(skip)
+
+        rows = (await self.db.execute(query.limit(limit + 1))).all()
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last.page_created_at, last.page_id)
+
+        return [row[0] if single else tuple(row[:-2]) for row in rows[:limit]], next_cursor
+
+    def _decode(self, cursor: str):
+        """Ключ из курсора в виде, сравнимом с колонкой; 400, если курсор поврежден"""
+        try:
+            created_at, row_id = decode_cursor(cursor)
+            if not isinstance(created_at, str):
+                raise TypeError(created_at)
+            row_id = int(row_id)
+            if self.sqlite:
+                return literal(created_at, String), row_id
+            return literal(datetime.fromisoformat(created_at), DateTime(timezone=True)), row_id
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_cursor(*key) -> str:
+    """Непрозрачный курсор из ключа сортировки последней строки страницы"""
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int = 2) -> List[Any]:
+    """Ключ сортировки из курсора (size значений); ValueError, если курсор поврежден"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return key
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """Передает курсор следующей страницы в заголовке ответа"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
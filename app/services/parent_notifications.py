@@ -1,11 +1,12 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
 from app.models.student import Student
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.models.textbook import Textbook
+from app.models.active_loan import ActiveLoan
 from app.services.max_bot_client import MaxBotClient
 
 
@@ -13,14 +14,14 @@ class ParentNotificationService:
     def __init__(self):
         self.max_bot = MaxBotClient()
     
-    async def notify_issue_textbooks(self, student_id: int, textbook_ids: List[int], db: Session):
+    async def notify_issue_textbooks(self, student_id: int, textbook_ids: List[int], db: AsyncSession):
         """Уведомление родителей о выдаче учебников"""
-        student = db.query(Student).filter(Student.id == student_id).first()
+        student = await db.get(Student, student_id)
         if not student or not student.parent_phone:
             return
         
         # Получаем информацию об учебниках
-        textbooks = db.query(Textbook).filter(Textbook.id.in_(textbook_ids)).all()
+        textbooks = (await db.scalars(select(Textbook).where(Textbook.id.in_(textbook_ids)))).all()
         
         if not textbooks:
             return
@@ -41,14 +42,14 @@ class ParentNotificationService:
             total_count=len(textbooks)
         )
     
-    async def notify_return_textbooks(self, student_id: int, textbook_ids: List[int], db: Session):
+    async def notify_return_textbooks(self, student_id: int, textbook_ids: List[int], db: AsyncSession):
         """Уведомление родителей о возврате учебников"""
-        student = db.query(Student).filter(Student.id == student_id).first()
+        student = await db.get(Student, student_id)
         if not student or not student.parent_phone:
             return
         
         # Получаем информацию об учебниках
-        textbooks = db.query(Textbook).filter(Textbook.id.in_(textbook_ids)).all()
+        textbooks = (await db.scalars(select(Textbook).where(Textbook.id.in_(textbook_ids)))).all()
         
         if not textbooks:
             return
@@ -69,13 +70,70 @@ class ParentNotificationService:
             total_count=len(textbooks)
         )
     
-    async def notify_lost_textbook(self, student_id: int, textbook_id: int, db: Session):
+    async def notify_transfer_textbooks(self, to_student_id: int, handed_over: Dict[int, List[int]], db: AsyncSession):
+        """Уведомление о передаче учебников: одно сообщение получателю и каждому прежнему владельцу
+
+        handed_over - id прежнего владельца -> id переданных им экземпляров
+        """
+        student_ids = {to_student_id, *handed_over}
+        students = {
+            student.id: student
+            for student in await db.scalars(select(Student).where(Student.id.in_(student_ids)))
+        }
+        textbooks = {
+            textbook.id: textbook
+            for textbook in await db.scalars(select(Textbook).where(
+                Textbook.id.in_([textbook_id for ids in handed_over.values() for textbook_id in ids])
+            ))
+        }
+        
+        recipient = students.get(to_student_id)
+        if not recipient:
+            return
+        
+        # Получателю - все полученные учебники с указанием, от кого
+        received = []
+        for from_student_id, textbook_ids in handed_over.items():
+            giver = students.get(from_student_id)
+            for textbook_id in textbook_ids:
+                textbook = textbooks[textbook_id]
+                from_name = giver.full_name if giver else "Unknown"
+                received.append(f"• {textbook.subject}: {textbook.title} (от: {from_name})")
+        
+        if recipient.parent_phone:
+            await self.max_bot.send_parent_notification(
+                parent_phone=recipient.parent_phone,
+                student_name=recipient.full_name,
+                message_type="transfer_in",
+                textbook_list="\n".join(received),
+                total_count=len(received)
+            )
+        
+        # Прежним владельцам - переданные ими учебники
+        for from_student_id, textbook_ids in handed_over.items():
+            giver = students.get(from_student_id)
+            if not giver or not giver.parent_phone:
+                continue
+            
+            await self.max_bot.send_parent_notification(
+                parent_phone=giver.parent_phone,
+                student_name=giver.full_name,
+                message_type="transfer_out",
+                textbook_list="\n".join(
+                    f"• {textbooks[textbook_id].subject}: {textbooks[textbook_id].title}"
+                    for textbook_id in textbook_ids
+                ),
+                total_count=len(textbook_ids),
+                recipient_name=recipient.full_name
+            )
+    
+    async def notify_lost_textbook(self, student_id: int, textbook_id: int, db: AsyncSession):
         """Уведомление родителей об утере учебника"""
-        student = db.query(Student).filter(Student.id == student_id).first()
+        student = await db.get(Student, student_id)
         if not student or not student.parent_phone:
             return
         
-        textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+        textbook = await db.get(Textbook, textbook_id)
         if not textbook:
             return
         
@@ -88,25 +146,21 @@ class ParentNotificationService:
             lost_date=datetime.utcnow().strftime("%d.%m.%Y")
         )
     
-    async def notify_found_textbook(self, finder_student_id: int, textbook_id: int, db: Session):
+    async def notify_found_textbook(self, finder_student_id: int, textbook_id: int, db: AsyncSession):
         """Уведомление родителей о находке учебника"""
-        finder_student = db.query(Student).filter(Student.id == finder_student_id).first()
-        textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+        finder_student = await db.get(Student, finder_student_id)
+        textbook = await db.get(Textbook, textbook_id)
         
         if not finder_student or not textbook:
             return
         
         # Находим владельца учебника
-        active_transaction = db.query(Transaction).filter(
-            Transaction.textbook_id == textbook_id,
-            Transaction.transaction_type == TransactionType.ISSUE,
-            Transaction.status == TransactionStatus.COMPLETED
-        ).first()
+        active_loan = await db.get(ActiveLoan, textbook_id)
         
-        if not active_transaction:
+        if not active_loan:
             return
         
-        owner_student = db.query(Student).filter(Student.id == active_transaction.student_id).first()
+        owner_student = await db.get(Student, active_loan.student_id)
         if not owner_student or not owner_student.parent_phone:
             return
         
@@ -119,41 +173,26 @@ class ParentNotificationService:
             finder_name=finder_student.full_name
         )
     
-    async def notify_bulk_issue_summary(self, grade: str, db: Session):
+    async def notify_bulk_issue_summary(self, grade: str, db: AsyncSession):
         """Уведомление родителей о массовой выдаче учебников в классе"""
         # Получаем всех учеников класса
-        students = db.query(Student).filter(
+        students = (await db.scalars(select(Student).where(
             Student.grade == grade,
             Student.is_active == True
-        ).all()
+        ))).all()
         
         for student in students:
             if not student.parent_phone:
                 continue
             
-            # Получаем активные учебники ученика
-            active_transactions = db.query(Transaction).filter(
-                Transaction.student_id == student.id,
-                Transaction.transaction_type == TransactionType.ISSUE,
-                Transaction.status == TransactionStatus.COMPLETED
-            ).all()
+            # Получаем учебники на руках у ученика
+            textbooks = (await db.scalars(select(Textbook).join(
+                ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+            ).where(
+                ActiveLoan.student_id == student.id
+            ))).all()
             
-            if not active_transactions:
-                continue
-            
-            # Проверяем, есть ли возвраты
-            active_textbooks = []
-            for transaction in active_transactions:
-                return_transaction = db.query(Transaction).filter(
-                    Transaction.textbook_id == transaction.textbook_id,
-                    Transaction.transaction_type == TransactionType.RETURN,
-                    Transaction.status == TransactionStatus.COMPLETED
-                ).first()
-                
-                if not return_transaction:
-                    textbook = db.query(Textbook).filter(Textbook.id == transaction.textbook_id).first()
-                    if textbook:
-                        active_textbooks.append(f"• {textbook.subject}: {textbook.title}")
+            active_textbooks = [f"• {textbook.subject}: {textbook.title}" for textbook in textbooks]
             
             if active_textbooks:
                 textbook_text = "\n".join(active_textbooks)
@@ -166,41 +205,26 @@ class ParentNotificationService:
                     total_count=len(active_textbooks)
                 )
     
-    async def notify_bulk_return_reminder(self, grade: str, db: Session):
+    async def notify_bulk_return_reminder(self, grade: str, db: AsyncSession):
         """Напоминание родителям о необходимости сдать учебники в конце года"""
         # Получаем всех учеников класса
-        students = db.query(Student).filter(
+        students = (await db.scalars(select(Student).where(
             Student.grade == grade,
             Student.is_active == True
-        ).all()
+        ))).all()
         
         for student in students:
             if not student.parent_phone:
                 continue
             
-            # Получаем активные учебники ученика
-            active_transactions = db.query(Transaction).filter(
-                Transaction.student_id == student.id,
-                Transaction.transaction_type == TransactionType.ISSUE,
-                Transaction.status == TransactionStatus.COMPLETED
-            ).all()
-            
-            if not active_transactions:
-                continue
+            # Получаем учебники на руках у ученика
+            textbooks = (await db.scalars(select(Textbook).join(
+                ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+            ).where(
+                ActiveLoan.student_id == student.id
+            ))).all()
             
-            # Проверяем, есть ли возвраты
-            not_returned_textbooks = []
-            for transaction in active_transactions:
-                return_transaction = db.query(Transaction).filter(
-                    Transaction.textbook_id == transaction.textbook_id,
-                    Transaction.transaction_type == TransactionType.RETURN,
-                    Transaction.status == TransactionStatus.COMPLETED
-                ).first()
-                
-                if not return_transaction:
-                    textbook = db.query(Textbook).filter(Textbook.id == transaction.textbook_id).first()
-                    if textbook:
-                        not_returned_textbooks.append(f"• {textbook.subject}: {textbook.title}")
+            not_returned_textbooks = [f"• {textbook.subject}: {textbook.title}" for textbook in textbooks]
             
             if not_returned_textbooks:
                 textbook_text = "\n".join(not_returned_textbooks)
@@ -213,9 +237,9 @@ class ParentNotificationService:
                     total_count=len(not_returned_textbooks)
                 )
     
-    async def notify_damage_check_reminder(self, student_id: int, db: Session):
+    async def notify_damage_check_reminder(self, student_id: int, db: AsyncSession):
         """Напоминание родителям о необходимости проверить повреждения в течение недели"""
-        student = db.query(Student).filter(Student.id == student_id).first()
+        student = await db.get(Student, student_id)
         if not student or not student.parent_phone:
             return
         
@@ -223,12 +247,12 @@ class ParentNotificationService:
         from datetime import timedelta
         week_ago = datetime.utcnow() - timedelta(days=7)
         
-        recent_transactions = db.query(Transaction).filter(
+        recent_transactions = (await db.scalars(select(Transaction).where(
             Transaction.student_id == student_id,
             Transaction.transaction_type == TransactionType.ISSUE,
             Transaction.status == TransactionStatus.COMPLETED,
             Transaction.issued_at >= week_ago
-        ).all()
+        ))).all()
         
         if recent_transactions:
             await self.max_bot.send_parent_notification(
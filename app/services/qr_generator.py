@@ -1,8 +1,10 @@
 import os
+import time
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 from typing import List
 from app.core.config import settings
+from app.core.metrics import qr_generation_duration_seconds
 
 
 class QRGenerator:
@@ -18,6 +20,8 @@ class QRGenerator:
         Генерация QR кода для учебника
         Возвращает путь к сохраненному файлу
         """
+        started_at = time.perf_counter()
+        
         # Создаем QR код
         qr = qrcode.QRCode(
             version=1,
@@ -37,6 +41,7 @@ class QRGenerator:
         filepath = os.path.join(settings.QR_CODES_DIR, filename)
         img.save(filepath)
         
+        qr_generation_duration_seconds.observe(time.perf_counter() - started_at)
         return filepath
 
 
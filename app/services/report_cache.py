@@ -0,0 +1,147 @@
+import functools
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.student import Student
+
+
+class ReportCache:
+    """
+    Кэш результатов отчетов с инвалидацией по записи.
+
+    Каждая запись помечается поколениями: глобальным и поколением класса
+    (для отчетов по всем классам - общим поколением классов). Запись в базу
+    увеличивает поколения затронутых классов, поэтому после записи отчет
+    пересчитывается, а отчеты других классов остаются в кэше. Если класс
+    неизвестен, увеличивается глобальное поколение и сбрасывается все.
+
+    Кэш хранится в памяти процесса: при запуске нескольких воркеров у
+    каждого свой кэш, и запись в одном воркере не видна другим.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[Tuple[int, int], Optional[float], Any]] = {}
+        self._global_generation = 0
+        self._all_grades_generation = 0
+        self._grade_generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def tag(self, grade: Optional[str] = None) -> Tuple[int, int]:
+        """Текущие поколения, от которых зависит отчет по классу (или по всем)"""
+        with self._lock:
+            if grade is None:
+                return self._global_generation, self._all_grades_generation
+            return self._global_generation, self._grade_generations.get(grade, 0)
+
+    def get(self, key: Hashable, tag: Tuple[int, int]) -> Optional[Any]:
+        """Результат из кэша, если он посчитан при тех же поколениях и не истек"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_tag, expires_at, value = entry
+                if entry_tag == tag and (expires_at is None or time.monotonic() < expires_at):
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, tag: Tuple[int, int], value: Any, ttl: Optional[float] = None) -> None:
+        """Сохраняет результат с поколениями, взятыми до его расчета"""
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (tag, expires_at, value)
+
+    def invalidate(self, *grades: Optional[str]) -> None:
+        """Сбрасывает отчеты классов; без аргументов - все отчеты"""
+        with self._lock:
+            if not grades or None in grades:
+                self._global_generation += 1
+                return
+
+            for grade in grades:
+                self._grade_generations[grade] = self._grade_generations.get(grade, 0) + 1
+            self._all_grades_generation += 1
+
+    async def invalidate_students(self, db: AsyncSession, student_ids: Iterable[int]) -> None:
+        """Сбрасывает отчеты классов, в которых учатся ученики"""
+        student_ids = {student_id for student_id in student_ids if student_id is not None}
+        if not student_ids:
+            return
+
+        grades = (await db.scalars(
+            select(Student.grade).where(Student.id.in_(student_ids)).distinct()
+        )).all()
+        self.invalidate(*grades)
+
+    def clear(self) -> None:
+        """Удаляет все записи и сбрасывает счетчики"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests * 100, 2) if requests else 0,
+                "entries": len(self._entries),
+                "generation": self._global_generation,
+                "grade_generations": dict(self._grade_generations)
+            }
+
+
+report_cache = ReportCache()
+
+
+def cached_report(name: str, per_grade: bool = True, ttl: Optional[float] = None):
+    """
+    Кэширует результат endpoint'а отчета по имени и параметрам запроса.
+
+    per_grade=False - отчет зависит от всех классов (например, содержит
+    статистику по классам) даже при фильтре по одному классу.
+    ttl - срок жизни записи в секундах для отчетов, которые меняются
+    не только от записи, но и от времени (например, просрочки).
+
+    Отчеты читаются через get_read_db. С репликой (DATABASE_READ_URL) отчет,
+    запрошенный сразу после записи, может быть посчитан по данным до нее и
+    сохранен под новым поколением, поэтому каждая запись тогда живет не дольше
+    REPLICA_REPORT_CACHE_SECONDS.
+    """
+    if settings.DATABASE_READ_URL:
+        ttl = min(ttl, settings.REPLICA_REPORT_CACHE_SECONDS) if ttl is not None \
+            else settings.REPLICA_REPORT_CACHE_SECONDS
+
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**kwargs):
+            if kwargs.get("export_format"):
+                # Потоковые выгрузки читаются один раз и не кэшируются
+                return await endpoint(**kwargs)
+
+            params = tuple(sorted(
+                (param, getattr(value, "value", value))
+                for param, value in kwargs.items()
+                if param not in ("db", "current_user")
+            ))
+            key = (name, params)
+            tag = report_cache.tag(kwargs.get("grade") if per_grade else None)
+
+            result = report_cache.get(key, tag)
+            if result is None:
+                result = await endpoint(**kwargs)
+                report_cache.set(key, tag, result, ttl)
+            return result
+
+        return wrapper
+
+    return decorator
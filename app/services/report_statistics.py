@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.user import User
+from app.models.student import Student
+from app.models.textbook import Textbook
+from app.models.damage_report import DamageReport, DamageType, DamageStatus
+from app.models.found_report import FoundReport, FoundStatus
+from app.models.active_loan import ActiveLoan
+
+
+class ReportStatistics:
+    """
+    Статистика по отчетам о повреждениях и находках и счетчики главной страницы.
+
+    Все разрезы (тип, статус, класс, предмет) считаются одним GROUP BY
+    запросом: число групп ограничено справочниками, а не количеством отчетов.
+    Автор отчета (reported_by) - это users.id, класс берется через users.student_id.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def damage_statistics(
+        self,
+        damage_type: Optional[DamageType] = None,
+        status: Optional[DamageStatus] = None,
+        grade: Optional[str] = None
+    ) -> Dict:
+        """Статистика по повреждениям: total, by_type, by_status, by_grade, by_subject"""
+        query = self._grouped(
+            DamageReport, DamageReport.damage_type, DamageReport.status
+        )
+
+        if damage_type:
+            query = query.where(DamageReport.damage_type == damage_type)
+
+        if status:
+            query = query.where(DamageReport.status == status)
+
+        if grade:
+            query = query.where(Student.grade == grade)
+
+        stats = {"total": 0, "by_type": {}, "by_status": {}, "by_grade": {}, "by_subject": {}}
+        for report_type, report_status, report_grade, subject, count in await self.db.execute(query):
+            self._add(stats, count, by_type=report_type, by_status=report_status,
+                      by_grade=report_grade, by_subject=subject)
+        return stats
+
+    async def found_statistics(self, grade: Optional[str] = None) -> Dict:
+        """Статистика по находкам: total, by_status, by_grade, by_subject"""
+        query = self._grouped(FoundReport, FoundReport.status)
+
+        if grade:
+            query = query.where(Student.grade == grade)
+
+        stats = {"total": 0, "by_status": {}, "by_grade": {}, "by_subject": {}}
+        for report_status, report_grade, subject, count in await self.db.execute(query):
+            self._add(stats, count, by_status=report_status,
+                      by_grade=report_grade, by_subject=subject)
+        return stats
+
+    async def dashboard_counts(self) -> Dict:
+        """Счетчики главной страницы: один SELECT из скалярных подзапросов"""
+        overdue_deadline = datetime.utcnow() - timedelta(days=settings.LOAN_PERIOD_DAYS)
+
+        counts = (await self.db.execute(select(
+            self._count(Student, Student.is_active == True).label("active_students"),
+            self._count(Textbook, Textbook.is_active == True).label("active_textbooks"),
+            self._count(ActiveLoan).label("on_loan"),
+            self._count(
+                Textbook,
+                Textbook.is_active == True,
+                ~exists().where(ActiveLoan.textbook_id == Textbook.id)
+            ).label("available"),
+            self._count(DamageReport, DamageReport.status == DamageStatus.PENDING).label("pending_damage"),
+            self._count(FoundReport, FoundReport.status == FoundStatus.FOUND).label("open_found"),
+            self._count(ActiveLoan, ActiveLoan.issued_at < overdue_deadline).label("overdue_loans")
+        ))).one()
+
+        return dict(counts._mapping)
+
+    @staticmethod
+    def _count(model, *criteria):
+        """Скалярный подзапрос COUNT(*) по таблице модели"""
+        return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+    @staticmethod
+    def _grouped(model, *columns):
+        """GROUP BY по колонкам отчета, классу автора и предмету учебника"""
+        return select(
+            *columns, Student.grade, Textbook.subject, func.count(model.id)
+        ).select_from(model).outerjoin(
+            Textbook, Textbook.id == model.textbook_id
+        ).outerjoin(
+            User, User.id == model.reported_by
+        ).outerjoin(
+            Student, Student.id == User.student_id
+        ).group_by(
+            *columns, Student.grade, Textbook.subject
+        )
+
+    @staticmethod
+    def _add(stats: Dict, count: int, **keys) -> None:
+        """Добавляет строку группировки во все разрезы"""
+        stats["total"] += count
+        for section, key in keys.items():
+            if key is None:
+                # Отчеты учителей не относятся ни к одному классу
+                continue
+            key = getattr(key, "value", key)
+            stats[section][key] = stats[section].get(key, 0) + count
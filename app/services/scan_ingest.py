@@ -0,0 +1,213 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.student import Student
+from app.models.textbook import Textbook
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.active_loan import ActiveLoan
+from app.models.scan_event import ScanEvent, ScanStatus
+from app.services.loan_ledger import LoanConflict, LoanLedger
+from app.services.bulk_insert import insert_returning
+
+
+class ScanIngest:
+    """
+    Применение пачки событий сканирования, накопленных станцией без сети.
+
+    События дедуплицируются по client_event_id: уже загруженные события
+    не применяются повторно, а возвращают сохраненный результат, поэтому
+    повторная отправка пачки безопасна. Экземпляры, ученики и текущие выдачи
+    читаются тремя запросами на всю пачку, дальше события применяются по
+    времени сканирования к состоянию выдач в памяти. Коммит - за вызывающим.
+    LoanConflict - выдачи изменил другой запрос между чтением и записью.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def ingest(self, events: List, received_by: int) -> Tuple[List[Dict], Set[int]]:
+        """Результаты в порядке событий запроса и ученики, чьи выдачи изменились"""
+        stored = {
+            scan.client_event_id: scan
+            for scan in await self.db.scalars(select(ScanEvent).where(
+                ScanEvent.client_event_id.in_({event.client_event_id for event in events})
+            ))
+        }
+
+        # Новые события: первое вхождение каждого client_event_id, не загруженное ранее
+        fresh = {}
+        for event in events:
+            if event.client_event_id not in stored:
+                fresh.setdefault(event.client_event_id, event)
+
+        applied, student_ids = await self._apply(list(fresh.values()), received_by)
+
+        results = []
+        for event in events:
+            if event.client_event_id in stored:
+                result = self._stored_result(stored[event.client_event_id])
+            else:
+                result = dict(applied[event.client_event_id])
+                # Повтор события внутри пачки
+                result["duplicate"] = fresh[event.client_event_id] is not event
+            results.append(result)
+
+        return results, student_ids
+
+    async def _apply(self, events: List, received_by: int) -> Tuple[Dict[str, Dict], Set[int]]:
+        """Применяет новые события и записывает их в журнал scan_events (без коммита)"""
+        if not events:
+            return {}, set()
+
+        textbooks = {
+            textbook.qr_code: (textbook, loan)
+            for textbook, loan in await self.db.execute(select(Textbook, ActiveLoan).outerjoin(
+                ActiveLoan, ActiveLoan.textbook_id == Textbook.id
+            ).where(
+                Textbook.qr_code.in_({event.qr_code for event in events})
+            ))
+        }
+        students = {
+            student.id: student
+            for student in await self.db.scalars(select(Student).where(
+                Student.id.in_({event.student_id for event in events if event.student_id is not None})
+            ))
+        }
+
+        # Текущая выдача экземпляра: ActiveLoan из базы или строка выдачи из пачки
+        loans = {textbook.id: loan for textbook, loan in textbooks.values()}
+        outcomes = {}
+        issue_rows = []
+        return_rows = []
+
+        # sorted устойчив: события с одинаковым временем применяются в порядке запроса
+        for event in sorted(events, key=lambda event: _utc(event.client_timestamp)):
+            scanned_at = _utc(event.client_timestamp)
+            textbook, _ = textbooks.get(event.qr_code, (None, None))
+            loan = loans.get(textbook.id) if textbook else None
+            row = None
+
+            if textbook is None:
+                reason = "not_found"
+            elif event.action == TransactionType.ISSUE:
+                student = students.get(event.student_id)
+                if not textbook.is_active:
+                    reason = "inactive"
+                elif loan is not None:
+                    reason = "already_issued"
+                elif student is None:
+                    reason = "student_not_found"
+                elif not student.is_active:
+                    reason = "student_inactive"
+                else:
+                    reason = None
+                    row = {
+                        "textbook_id": textbook.id,
+                        "student_id": student.id,
+                        "transaction_type": TransactionType.ISSUE,
+                        "status": TransactionStatus.COMPLETED,
+                        "issued_by": received_by,
+                        "issued_at": scanned_at
+                    }
+                    issue_rows.append(row)
+                    loans[textbook.id] = row
+            elif loan is None:
+                reason = "not_issued"
+            else:
+                # Возврат записывается на того, у кого экземпляр на руках
+                reason = None
+                row = {
+                    "textbook_id": textbook.id,
+                    "student_id": loan.student_id if isinstance(loan, ActiveLoan) else loan["student_id"],
+                    "transaction_type": TransactionType.RETURN,
+                    "status": TransactionStatus.COMPLETED,
+                    "issued_by": received_by,
+                    "issued_at": scanned_at,
+                    "returned_at": scanned_at,
+                    # Выдача из этой же пачки получит id только после вставки
+                    "issue_transaction_id": loan.transaction_id if isinstance(loan, ActiveLoan) else loan
+                }
+                return_rows.append(row)
+                loans[textbook.id] = None
+
+            outcomes[event.client_event_id] = (event, scanned_at, reason, row)
+
+        # Сначала выдачи, затем ссылающиеся на них возвраты
+        transactions = dict(zip(map(id, issue_rows), await insert_returning(self.db, Transaction, issue_rows, "textbook_id")))
+        for row in return_rows:
+            if isinstance(row["issue_transaction_id"], dict):
+                row["issue_transaction_id"] = transactions[id(row["issue_transaction_id"])].id
+        transactions.update(zip(map(id, return_rows), await insert_returning(self.db, Transaction, return_rows, "textbook_id")))
+
+        # active_loans приводится к итоговому состоянию пачки: сначала закрываются
+        # изменившиеся выдачи из базы, затем открываются новые. Выдачу, которую
+        # после чтения закрыл другой запрос, пачка не применяет (LoanConflict)
+        ledger = LoanLedger(self.db)
+        closing = [
+            (textbook.id, loan.transaction_id) for textbook, loan in textbooks.values()
+            if loan is not None and loans[textbook.id] is not loan
+        ]
+        if len(await ledger.close_loans(closing)) != len(closing):
+            raise LoanConflict("Textbooks were returned concurrently")
+        await ledger.open_loans([
+            transactions[id(loan)] for loan in loans.values() if isinstance(loan, dict)
+        ])
+
+        rows = []
+        applied = {}
+        for client_event_id, (event, scanned_at, reason, transaction_row) in outcomes.items():
+            transaction = transactions[id(transaction_row)] if transaction_row else None
+            row = {
+                "client_event_id": client_event_id,
+                "qr_code": event.qr_code,
+                "student_id": transaction.student_id if transaction else self._known_student(event, students),
+                "action": TransactionType(event.action.value),
+                "client_timestamp": scanned_at,
+                "status": ScanStatus.REJECTED if reason else ScanStatus.APPLIED,
+                "reason": reason,
+                "transaction_id": transaction.id if transaction else None,
+                "received_by": received_by
+            }
+            rows.append(row)
+            applied[client_event_id] = self._result(row)
+
+        await self.db.execute(insert(ScanEvent), rows)
+
+        student_ids = {row["student_id"] for row in issue_rows + return_rows}
+        return applied, student_ids
+
+    @staticmethod
+    def _known_student(event, students: Dict[int, Student]) -> Optional[int]:
+        """student_id события, если такой ученик есть (иначе нарушится внешний ключ)"""
+        return event.student_id if event.student_id in students else None
+
+    @staticmethod
+    def _result(row: Dict) -> Dict:
+        """Результат только что примененного события"""
+        return {
+            "client_event_id": row["client_event_id"],
+            "status": row["status"].value,
+            "reason": row["reason"],
+            "transaction_id": row["transaction_id"],
+            "duplicate": False
+        }
+
+    @staticmethod
+    def _stored_result(scan: ScanEvent) -> Dict:
+        """Результат ранее загруженного события"""
+        return {
+            "client_event_id": scan.client_event_id,
+            "status": scan.status.value,
+            "reason": scan.reason,
+            "transaction_id": scan.transaction_id,
+            "duplicate": True
+        }
+
+
+def _utc(moment: datetime) -> datetime:
+    """Время станции в UTC без часового пояса, как datetime.utcnow() в остальном API"""
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
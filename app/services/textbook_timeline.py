@@ -0,0 +1,177 @@
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import DateTime, String, cast, func, literal, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user import User
+from app.models.student import Student
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.damage_report import DamageReport, DamageType, DamageStatus
+from app.models.found_report import FoundReport, FoundStatus
+from app.services.pagination import decode_cursor, encode_cursor
+
+
+# Порядок источников внутри одной секунды: id в разных таблицах могут совпадать
+SOURCE_TRANSACTION = 0
+SOURCE_DAMAGE = 1
+SOURCE_FOUND = 2
+
+
+class TextbookTimeline:
+    """
+    История экземпляра учебника: транзакции, повреждения и находки.
+
+    Лента строится одним UNION ALL запросом с сортировкой в базе от новых
+    событий к старым и листается по курсору (date, source, id), поэтому
+    стоимость страницы не зависит от длины истории экземпляра.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def page(
+        self,
+        textbook_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Страница событий (новые первыми) и курсор следующей страницы"""
+        timeline = self._events(textbook_id).subquery()
+        date_key = self._date_key(timeline.c.date)
+        query = self._ordered(timeline, date_key).limit(limit + 1)
+
+        if cursor:
+            date, source, event_id = self._decode(cursor)
+            query = query.where(
+                tuple_(date_key, timeline.c.source, timeline.c.id)
+                < tuple_(self._date_key(self._date_literal(date)), source, event_id)
+            )
+
+        rows = (await self.db.execute(query)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last.date, last.source, last.id)
+        return [self._event(row) for row in rows[:limit]], next_cursor
+
+    async def stream(self, textbook_id: int, batch_size: int = 500) -> AsyncIterator[Dict]:
+        """Вся история экземпляра (новые первыми), читаемая из курсора пачками"""
+        timeline = self._events(textbook_id).subquery()
+        query = self._ordered(timeline, self._date_key(timeline.c.date))
+
+        async for row in await self.db.stream(query.execution_options(yield_per=batch_size)):
+            yield self._event(row)
+
+    @staticmethod
+    def _decode(cursor: str) -> Tuple[datetime, int, int]:
+        """Ключ сортировки (date, source, id) из курсора; ValueError, если курсор поврежден"""
+        date, source, event_id = decode_cursor(cursor, 3)
+        try:
+            return datetime.fromisoformat(date), int(source), int(event_id)
+        except TypeError as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def _ordered(timeline, date_key):
+        """События от новых к старым по ключу (date, source, id)"""
+        return select(timeline).order_by(
+            date_key.desc(), timeline.c.source.desc(), timeline.c.id.desc()
+        )
+
+    def _date_key(self, column):
+        """Дата события в виде, одинаково сравнимом для строк из базы и курсора"""
+        if self.db.get_bind().dialect.name == "sqlite":
+            # server_default func.now() пишет '2024-09-01 08:00:00', а SQLAlchemy
+            # '2024-09-01 08:00:00.000000' - без приведения строки сравниваются неверно
+            return func.strftime("%Y-%m-%d %H:%M:%f", column)
+        return column
+
+    def _date_literal(self, date: datetime):
+        """Дата из курсора как параметр того же типа, что и даты событий"""
+        if self.db.get_bind().dialect.name == "sqlite":
+            return literal(date, DateTime())
+        return literal(date, DateTime(timezone=True))
+
+    def _events(self, textbook_id: int):
+        """UNION ALL по трем журналам с единым набором колонок"""
+        # Enum приводятся к строке явно: в PostgreSQL это разные типы, и UNION их не объединяет
+        transactions = select(
+            Transaction.issued_at.label("date"),
+            literal(SOURCE_TRANSACTION).label("source"),
+            Transaction.id.label("id"),
+            cast(Transaction.transaction_type, String).label("action"),
+            cast(Transaction.status, String).label("status"),
+            literal(None, String).label("damage_type"),
+            Student.last_name, Student.first_name, Student.middle_name
+        ).outerjoin(
+            Student, Student.id == Transaction.student_id
+        ).where(Transaction.textbook_id == textbook_id)
+
+        # Автор отчета (reported_by) - это users.id, ученик берется через users.student_id
+        damage = select(
+            DamageReport.reported_at,
+            literal(SOURCE_DAMAGE),
+            DamageReport.id,
+            literal("damage_reported", String),
+            cast(DamageReport.status, String),
+            cast(DamageReport.damage_type, String),
+            Student.last_name, Student.first_name, Student.middle_name
+        ).outerjoin(
+            User, User.id == DamageReport.reported_by
+        ).outerjoin(
+            Student, Student.id == User.student_id
+        ).where(DamageReport.textbook_id == textbook_id)
+
+        found = select(
+            FoundReport.found_at,
+            literal(SOURCE_FOUND),
+            FoundReport.id,
+            literal("found_reported", String),
+            cast(FoundReport.status, String),
+            literal(None, String),
+            Student.last_name, Student.first_name, Student.middle_name
+        ).outerjoin(
+            User, User.id == FoundReport.reported_by
+        ).outerjoin(
+            Student, Student.id == User.student_id
+        ).where(FoundReport.textbook_id == textbook_id)
+
+        return union_all(transactions, damage, found)
+
+    @staticmethod
+    def _event(row) -> Dict:
+        """Строка UNION ALL -> событие истории в прежнем формате ответа"""
+        if row.last_name is None:
+            student_name = "Unknown"
+        else:
+            student_name = " ".join(
+                part for part in (row.last_name, row.first_name, row.middle_name) if part
+            )
+
+        # Enum колонки хранят имена членов, в ответ отдаются значения
+        if row.source == SOURCE_TRANSACTION:
+            return {
+                "date": row.date,
+                "type": "transaction",
+                "action": TransactionType[row.action].value,
+                "student_name": student_name,
+                "status": TransactionStatus[row.status].value
+            }
+
+        if row.source == SOURCE_DAMAGE:
+            return {
+                "date": row.date,
+                "type": "damage",
+                "action": row.action,
+                "student_name": student_name,
+                "damage_type": DamageType[row.damage_type].value,
+                "status": DamageStatus[row.status].value
+            }
+
+        return {
+            "date": row.date,
+            "type": "found",
+            "action": row.action,
+            "student_name": student_name,
+            "status": FoundStatus[row.status].value
+        }
@@ -1,10 +1,28 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from app.core.config import settings
 from app.core.database import create_tables
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, metrics
+from app.core.query_stats import QueryStatsMiddleware
 from app.api import auth, users, students, textbooks, transactions, damage_reports, found_reports, student_accounts, student_actions, reports, bot_management
 
 app = FastAPI(title="Textbook Management System", version="0.1.0")
 
+# Метрики маршрутов; добавляется раньше учета SQL, чтобы оказаться внутри него
+# и получить SQL-запросы текущего HTTP-запроса
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Учет SQL-запросов каждого HTTP-запроса: Server-Timing и debug-лог
+if settings.SQL_INSTRUMENTATION:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        budget=settings.SQL_QUERY_BUDGET,
+        strict=settings.SQL_QUERY_BUDGET_STRICT,
+        repeated_threshold=settings.SQL_REPEATED_QUERY_THRESHOLD
+    )
+
 # Подключение статических файлов
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -41,6 +59,12 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        """Метрики процесса в текстовом формате Prometheus"""
+        return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
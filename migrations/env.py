@@ -2,8 +2,9 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
+from app.core.config import settings
 from app.core.database import Base
-from app.models import user, student, textbook, transaction, damage_report, found_report
+from app.models import user, student, textbook, transaction, damage_report, found_report, active_loan, scan_event
 
 # this is the Alembic Config object
 config = context.config
@@ -12,6 +13,9 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Миграции применяются к той же базе, что использует приложение
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
 # add your model's MetaData object here
 target_metadata = Base.metadata
 
@@ -31,7 +35,7 @@ def run_migrations_offline() -> None:
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode."""
     connectable = engine_from_config(
-        config.get_section(config.config_section),
+        config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
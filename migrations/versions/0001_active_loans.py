@@ -0,0 +1,56 @@
+"""active loans
+
+Revision ID: 0001_active_loans
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_active_loans'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица могла быть уже создана через create_tables() при старте приложения
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("active_loans"):
+        op.create_table(
+            "active_loans",
+            sa.Column("textbook_id", sa.Integer(), sa.ForeignKey("textbooks.id"), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id"), nullable=False),
+            sa.Column("transaction_id", sa.Integer(), sa.ForeignKey("transactions.id"), nullable=False, unique=True),
+            sa.Column("issued_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_active_loans_student_id", "active_loans", ["student_id"])
+
+    # Экземпляр на руках, если его последняя завершенная транзакция - выдача
+    op.execute(sa.text("""
+        INSERT INTO active_loans (textbook_id, student_id, transaction_id, issued_at)
+        SELECT t.textbook_id, t.student_id, t.id, t.issued_at
+        FROM transactions t
+        WHERE t.transaction_type = 'ISSUE'
+          AND t.status = 'COMPLETED'
+          AND NOT EXISTS (
+              SELECT 1 FROM transactions later
+              WHERE later.textbook_id = t.textbook_id
+                AND later.status = 'COMPLETED'
+                AND (later.issued_at > t.issued_at
+                     OR (later.issued_at = t.issued_at AND later.id > t.id))
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM active_loans al WHERE al.textbook_id = t.textbook_id
+          )
+    """))
+
+
+def downgrade() -> None:
+    op.drop_index("ix_active_loans_student_id", table_name="active_loans")
+    op.drop_table("active_loans")
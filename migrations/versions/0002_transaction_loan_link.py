@@ -0,0 +1,55 @@
+"""link returns to the issue they close
+
+Revision ID: 0002_transaction_loan_link
+Revises: 0001_active_loans
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_transaction_loan_link'
+down_revision: Union[str, None] = '0001_active_loans'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("transactions")}
+    if "issue_transaction_id" not in columns:
+        with op.batch_alter_table("transactions") as batch_op:
+            batch_op.add_column(sa.Column("issue_transaction_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_transactions_issue_transaction_id", "transactions",
+                ["issue_transaction_id"], ["id"]
+            )
+            batch_op.create_index("ix_transactions_issue_transaction_id", ["issue_transaction_id"])
+
+    # Каждый возврат закрывает последнюю выдачу этого экземпляра до него
+    op.execute(sa.text("""
+        UPDATE transactions
+        SET issue_transaction_id = (
+            SELECT i.id FROM transactions i
+            WHERE i.textbook_id = transactions.textbook_id
+              AND i.transaction_type = 'ISSUE'
+              AND i.status = 'COMPLETED'
+              AND (i.issued_at < transactions.issued_at
+                   OR (i.issued_at = transactions.issued_at AND i.id < transactions.id))
+            ORDER BY i.issued_at DESC, i.id DESC
+            LIMIT 1
+        )
+        WHERE transaction_type = 'RETURN'
+          AND issue_transaction_id IS NULL
+    """))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("transactions") as batch_op:
+        batch_op.drop_index("ix_transactions_issue_transaction_id")
+        batch_op.drop_constraint("fk_transactions_issue_transaction_id", type_="foreignkey")
+        batch_op.drop_column("issue_transaction_id")
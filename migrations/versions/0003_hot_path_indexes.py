@@ -0,0 +1,43 @@
+"""composite indexes for hot filter columns
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_transaction_loan_link
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_hot_path_indexes'
+down_revision: Union[str, None] = '0002_transaction_loan_link'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (таблица, имя индекса, колонки) - имена совпадают с объявленными в моделях
+INDEXES = [
+    ("transactions", "ix_transactions_textbook_type_status", ["textbook_id", "transaction_type", "status"]),
+    ("transactions", "ix_transactions_student_type_status", ["student_id", "transaction_type", "status"]),
+    ("damage_reports", "ix_damage_reports_status_reported_at", ["status", "reported_at"]),
+    ("damage_reports", "ix_damage_reports_textbook_reported_by", ["textbook_id", "reported_by"]),
+    ("students", "ix_students_grade_is_active", ["grade", "is_active"]),
+    ("users", "ix_users_student_id", ["student_id"]),
+]
+
+
+def upgrade() -> None:
+    # Индексы могли быть уже созданы через create_tables() на новой базе
+    inspector = sa.inspect(op.get_bind())
+    for table, name, columns in INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for table, name, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,48 @@
+"""scan events journal for offline QR uploads
+
+Revision ID: 0004_scan_events
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_scan_events'
+down_revision: Union[str, None] = '0003_hot_path_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица могла быть уже создана через create_tables() при старте приложения
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("scan_events"):
+        return
+
+    op.create_table(
+        "scan_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("client_event_id", sa.String(), nullable=False),
+        sa.Column("qr_code", sa.String(), nullable=False),
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id"), nullable=True),
+        sa.Column("action", sa.Enum("ISSUE", "RETURN", name="transactiontype", native_enum=False), nullable=False),
+        sa.Column("client_timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("status", sa.Enum("APPLIED", "REJECTED", name="scanstatus", native_enum=False), nullable=False),
+        sa.Column("reason", sa.String(), nullable=True),
+        sa.Column("transaction_id", sa.Integer(), sa.ForeignKey("transactions.id"), nullable=True),
+        sa.Column("received_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("received_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_scan_events_id", "scan_events", ["id"])
+    op.create_index("ix_scan_events_client_event_id", "scan_events", ["client_event_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_scan_events_client_event_id", table_name="scan_events")
+    op.drop_index("ix_scan_events_id", table_name="scan_events")
+    op.drop_table("scan_events")
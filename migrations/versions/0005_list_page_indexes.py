@@ -0,0 +1,36 @@
+"""(created_at, id) indexes for keyset pagination of lists
+
+Revision ID: 0005_list_page_indexes
+Revises: 0004_scan_events
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_list_page_indexes'
+down_revision: Union[str, None] = '0004_scan_events'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ["students", "textbooks", "transactions", "damage_reports", "found_reports", "users"]
+
+
+def upgrade() -> None:
+    # Индексы могли быть уже созданы через create_tables() на новой базе
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        name = f"ix_{table}_created_at_id"
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, ["created_at", "id"])
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_index(f"ix_{table}_created_at_id", table_name=table)
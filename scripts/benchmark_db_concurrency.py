@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное сравнение баз данных при одновременном чтении и записи
+
+Заполняет временные базы одинаковыми данными и на каждой запускает
+одновременно читателей (страница журнала транзакций, как GET /api/transactions)
+и писателей (выдача и возврат через LoanLedger, как POST /issue и /return).
+SQLite проверяется дважды: с настройками по умолчанию (журнал отката) и
+с производственным профилем из настроек (WAL и PRAGMA). С --postgres тот же
+набор запускается еще и на временном локальном PostgreSQL (scripts/local_postgres.py).
+Печатает пропускную способность чтения и записи, задержку p95 и ошибки блокировок.
+
+Запуск: python scripts/benchmark_db_concurrency.py [--seconds 10] [--readers 8] [--writers 2] [--postgres]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+STUDENTS = 300
+TEXTBOOKS = 3000
+TRANSACTIONS = 30000
+
+
+async def seed(engine):
+    """Учитель, ученики, учебники и история транзакций; выданных экземпляров нет"""
+    from app.core.database import Base
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.textbook import Textbook
+    from app.models.transaction import Transaction, TransactionType, TransactionStatus
+
+    random.seed(42)
+    start = datetime(2020, 9, 1)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        # Учитель с id 1 - автор всех транзакций (PostgreSQL проверяет внешние ключи)
+        await conn.execute(User.__table__.insert(), [
+            {"username": "teacher", "password_hash": "-", "role": UserRole.TEACHER}
+        ])
+        await conn.execute(Student.__table__.insert(), [
+            {"first_name": f"Имя{i}", "last_name": f"Фамилия{i}", "grade": "7А"}
+            for i in range(STUDENTS)
+        ])
+        await conn.execute(Textbook.__table__.insert(), [
+            {"qr_code": f"TEXTBOOK_{i}", "subject": f"Предмет {i % 10}", "title": f"Учебник {i % 40}"}
+            for i in range(TEXTBOOKS)
+        ])
+        moments = [start + timedelta(minutes=5 * i) for i in range(TRANSACTIONS)]
+        await conn.execute(Transaction.__table__.insert(), [
+            {
+                "textbook_id": random.randint(1, TEXTBOOKS),
+                "student_id": random.randint(1, STUDENTS),
+                "transaction_type": TransactionType.RETURN if i % 2 else TransactionType.ISSUE,
+                "status": TransactionStatus.COMPLETED,
+                "issued_by": 1,
+                "issued_at": moment,
+                "created_at": moment
+            }
+            for i, moment in enumerate(moments)
+        ])
+
+
+async def reader(sessions, stop: float, latencies: list, errors: list):
+    """Первая страница журнала транзакций с названием учебника и учеником"""
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+    from app.models.student import Student
+    from app.models.textbook import Textbook
+    from app.models.transaction import Transaction
+
+    query = select(
+        Transaction.id, Textbook.title, Student.last_name, Transaction.transaction_type, Transaction.issued_at
+    ).join(
+        Textbook, Textbook.id == Transaction.textbook_id
+    ).join(
+        Student, Student.id == Transaction.student_id
+    ).order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(100)
+
+    while time.perf_counter() < stop:
+        began = time.perf_counter()
+        try:
+            async with sessions() as db:
+                (await db.execute(query)).all()
+            latencies.append(time.perf_counter() - began)
+        except OperationalError:
+            errors.append("read")
+
+
+async def writer(sessions, textbook_ids: list, stop: float, latencies: list, errors: list):
+    """Выдача и возврат своих экземпляров по очереди, каждая операция - отдельный коммит"""
+    from sqlalchemy.exc import OperationalError
+    from app.models.transaction import Transaction, TransactionType, TransactionStatus
+    from app.services.loan_ledger import LoanLedger
+
+    on_loan = {}
+    step = 0
+    while time.perf_counter() < stop:
+        textbook_id = textbook_ids[step % len(textbook_ids)]
+        step += 1
+        began = time.perf_counter()
+        try:
+            async with sessions() as db:
+                ledger = LoanLedger(db)
+                now = datetime.utcnow()
+                if textbook_id in on_loan:
+                    loan = await ledger.get_loan(textbook_id)
+                    transaction = Transaction(
+                        textbook_id=textbook_id, student_id=loan.student_id,
+                        transaction_type=TransactionType.RETURN, status=TransactionStatus.COMPLETED,
+                        issued_by=1, issued_at=now, returned_at=now
+                    )
+                    db.add(transaction)
+                    await ledger.close_loan(loan, transaction)
+                else:
+                    transaction = Transaction(
+                        textbook_id=textbook_id, student_id=random.randint(1, STUDENTS),
+                        transaction_type=TransactionType.ISSUE, status=TransactionStatus.COMPLETED,
+                        issued_by=1, issued_at=now
+                    )
+                    db.add(transaction)
+                    await ledger.open_loan(transaction)
+                await db.commit()
+            if textbook_id in on_loan:
+                del on_loan[textbook_id]
+            else:
+                on_loan[textbook_id] = True
+            latencies.append(time.perf_counter() - began)
+        except OperationalError:
+            errors.append("write")
+
+
+async def run_profile(database_url: str, production: bool, args) -> dict:
+    """Нагрузка на свежую базу; production - PRAGMA производственного профиля SQLite"""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.core.database import async_database_url, engine_options, enable_sqlite_pragmas, sqlite_pragmas
+
+    url = async_database_url(database_url)
+    engine = create_async_engine(url, **engine_options(url))
+    if production:
+        enable_sqlite_pragmas(engine.sync_engine, sqlite_pragmas())
+    await seed(engine)
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    read_latencies, write_latencies, errors = [], [], []
+    stop = time.perf_counter() + args.seconds
+    textbooks_per_writer = TEXTBOOKS // args.writers
+    await asyncio.gather(
+        *[reader(sessions, stop, read_latencies, errors) for _ in range(args.readers)],
+        *[
+            writer(
+                sessions,
+                list(range(1 + i * textbooks_per_writer, 1 + (i + 1) * textbooks_per_writer)),
+                stop, write_latencies, errors
+            )
+            for i in range(args.writers)
+        ]
+    )
+    await engine.dispose()
+
+    return {
+        "reads": len(read_latencies) / args.seconds,
+        "writes": len(write_latencies) / args.seconds,
+        "read_p95": percentile(read_latencies, 0.95),
+        "write_p95": percentile(write_latencies, 0.95),
+        "errors": len(errors)
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Перцентиль задержки в миллисекундах"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--postgres", action="store_true", help="также временный локальный PostgreSQL")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    from app.models import user, student, textbook, transaction, damage_report, found_report, active_loan, scan_event
+
+    directory = tempfile.mkdtemp()
+    profiles = [
+        ("sqlite", f"sqlite:///{os.path.join(directory, 'default.db')}", False),
+        ("sqlite-prod", f"sqlite:///{os.path.join(directory, 'production.db')}", True),
+    ]
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        if args.postgres:
+            from local_postgres import temporary_postgres
+
+            profiles.append(("postgres", stack.enter_context(temporary_postgres()), False))
+
+        for name, database_url, production in profiles:
+            print(f"⏳ Профиль {name}: {args.readers} читателей, {args.writers} писателей, {args.seconds:g} с")
+            results[name] = asyncio.run(run_profile(database_url, production, args))
+
+    print(f"\n{'Профиль':<12}{'чтений/с':>10}{'записей/с':>11}{'p95 чтения':>12}{'p95 записи':>12}{'ошибок':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<12}{result['reads']:>10.0f}{result['writes']:>11.0f}"
+            f"{result['read_p95']:>10.1f}мс{result['write_p95']:>10.1f}мс{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
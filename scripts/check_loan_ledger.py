@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Проверка условного закрытия выдач в LoanLedger
+
+Имитирует две станции: первая читает открытую выдачу, вторая тем временем
+принимает экземпляр и выдает его заново. Закрытие по устаревшему чтению
+не должно удалить новую выдачу. По умолчанию база - SQLite, с --postgres -
+временный локальный PostgreSQL (см. scripts/local_postgres.py).
+
+Запуск: python scripts/check_loan_ledger.py [--postgres]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+async def issue(db, textbook, student, teacher):
+    """Выдача экземпляра через LoanLedger, как в API"""
+    from app.models.transaction import Transaction, TransactionType, TransactionStatus
+    from app.services.loan_ledger import LoanLedger
+
+    transaction = Transaction(
+        textbook_id=textbook.id, student_id=student.id,
+        transaction_type=TransactionType.ISSUE, status=TransactionStatus.COMPLETED,
+        issued_by=teacher.id, issued_at=datetime.utcnow()
+    )
+    db.add(transaction)
+    await LoanLedger(db).open_loan(transaction)
+    await db.commit()
+    return transaction
+
+
+async def check_stale_close(database_url: str) -> list:
+    """Сценарий устаревшего чтения; список сообщений об ошибках"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from app.core.database import Base, async_database_url
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.textbook import Textbook
+    from app.services.loan_ledger import LoanLedger
+
+    engine = create_async_engine(async_database_url(database_url))
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    failures = []
+    async with AsyncSession(engine, expire_on_commit=False) as station, \
+            AsyncSession(engine, expire_on_commit=False) as other_station:
+        teacher = User(username="teacher", password_hash="-", role=UserRole.TEACHER)
+        first = Student(first_name="Имя1", last_name="Фамилия1", grade="7А")
+        second = Student(first_name="Имя2", last_name="Фамилия2", grade="7А")
+        textbook = Textbook(qr_code="TEXTBOOK_1", subject="Математика", title="Алгебра 7")
+        station.add_all([teacher, first, second, textbook])
+        await station.commit()
+
+        first_issue = await issue(station, textbook, first, teacher)
+        # Первая станция прочитала выдачу и завершила транзакцию чтения
+        stale_loan = (textbook.id, first_issue.id)
+        await station.commit()
+
+        # Вторая станция принимает экземпляр и выдает его другому ученику
+        other_ledger = LoanLedger(other_station)
+        closed = await other_ledger.close_loans([stale_loan])
+        await other_station.commit()
+        if closed != {textbook.id}:
+            failures.append(f"актуальная выдача не закрыта: {closed}")
+        second_issue = await issue(other_station, textbook, second, teacher)
+
+        # Закрытие по устаревшему чтению ничего не удаляет
+        closed = await LoanLedger(station).close_loans([stale_loan])
+        await station.commit()
+        if closed:
+            failures.append(f"закрыта выдача по устаревшему чтению: {closed}")
+
+        loan = await LoanLedger(station).get_loan(textbook.id)
+        if loan is None or loan.transaction_id != second_issue.id:
+            failures.append("новая выдача удалена закрытием по устаревшему чтению")
+
+    await engine.dispose()
+    return failures
+
+
+@contextlib.contextmanager
+def database_url(postgres: bool):
+    """URL временной базы"""
+    if postgres:
+        from local_postgres import temporary_postgres
+
+        with temporary_postgres() as url:
+            yield url
+    else:
+        yield f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'loan_ledger.db')}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка условного закрытия выдач")
+    parser.add_argument("--postgres", action="store_true", help="временный локальный PostgreSQL вместо SQLite")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    from app.models import user, student, textbook, transaction, damage_report, found_report, active_loan, scan_event
+
+    with database_url(args.postgres) as url:
+        failures = asyncio.run(check_stale_close(url))
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+
+    print("🎉 Закрытие по устаревшему чтению не затрагивает новую выдачу")
+
+
+if __name__ == "__main__":
+    main()
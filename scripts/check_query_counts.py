@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Проверка количества SQL-запросов в отчетах
+
+Заполняет две временные базы разного размера и проверяет, что
+количество запросов каждого отчета не зависит от количества строк.
+По умолчанию базы - SQLite, с --postgres - временный локальный PostgreSQL
+(см. scripts/local_postgres.py).
+
+Запуск: python scripts/check_query_counts.py [--postgres]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+GRADES = ["7А", "7Б", "8А"]
+
+
+async def seed(db, scale: int):
+    """Заполняет базу: выдачи и возвраты проходят через LoanLedger, как в API"""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.textbook import Textbook
+    from app.models.transaction import Transaction, TransactionType, TransactionStatus
+    from app.models.damage_report import DamageReport, DamageType, DamageStatus
+    from app.models.found_report import FoundReport, FoundStatus
+    from app.services.loan_ledger import LoanLedger
+
+    random.seed(scale)
+    students = [
+        Student(first_name=f"Имя{i}", last_name=f"Фамилия{i}", grade=GRADES[i % len(GRADES)])
+        for i in range(10 * scale)
+    ]
+    textbooks = [
+        Textbook(qr_code=f"TEXTBOOK_{scale}_{i}", subject=f"Предмет {i % 5}", title=f"Учебник {i % 12}")
+        for i in range(30 * scale)
+    ]
+    teacher = User(username="teacher", password_hash="-", role=UserRole.TEACHER)
+    db.add_all(students + textbooks + [teacher])
+    await db.flush()
+
+    ledger = LoanLedger(db)
+    moment = datetime(2024, 9, 1)
+    for step in range(100 * scale):
+        textbook = random.choice(textbooks)
+        moment += timedelta(minutes=30)
+        loan = await ledger.get_loan(textbook.id)
+        if loan:
+            transaction = Transaction(
+                textbook_id=textbook.id, student_id=loan.student_id,
+                transaction_type=TransactionType.RETURN, status=TransactionStatus.COMPLETED,
+                issued_by=teacher.id, issued_at=moment, returned_at=moment
+            )
+            db.add(transaction)
+            await ledger.close_loan(loan, transaction)
+        else:
+            transaction = Transaction(
+                textbook_id=textbook.id, student_id=random.choice(students).id,
+                transaction_type=TransactionType.ISSUE, status=TransactionStatus.COMPLETED,
+                issued_by=teacher.id, issued_at=moment
+            )
+            db.add(transaction)
+            await ledger.open_loan(transaction)
+        await db.flush()
+
+    users = [
+        User(username=f"student_{student.id}", password_hash="-", role=UserRole.STUDENT, student_id=student.id)
+        for student in students
+    ]
+    db.add_all(users)
+    await db.flush()
+
+    for step in range(20 * scale):
+        db.add(DamageReport(
+            textbook_id=random.choice(textbooks).id, reported_by=random.choice(users).id,
+            damage_type=random.choice(list(DamageType)), status=random.choice(list(DamageStatus)),
+            description="Порванная обложка"
+        ))
+        db.add(FoundReport(
+            textbook_id=random.choice(textbooks).id, reported_by=random.choice(users).id,
+            found_location="Спортзал", status=random.choice(list(FoundStatus))
+        ))
+
+    await db.commit()
+
+
+def report_calls():
+    """Отчеты и параметры, для которых проверяется количество запросов"""
+    from app.api import reports, damage_reports, found_reports
+
+    return [
+        ("issue-summary", reports.get_issue_summary, {"grade": None, "export_format": None}),
+        ("issue-summary?grade=7А", reports.get_issue_summary, {"grade": "7А", "export_format": None}),
+        ("not-returned", reports.get_not_returned_report, {"grade": None, "export_format": None}),
+        ("not-returned?grade=7А", reports.get_not_returned_report, {"grade": "7А", "export_format": None}),
+        ("not-issued", reports.get_not_issued_report, {"grade": None, "export_format": None}),
+        ("not-issued?grade=7А", reports.get_not_issued_report, {"grade": "7А", "export_format": None}),
+        ("damage-summary", reports.get_damage_summary, {"grade": None, "damage_type": None, "status": None, "export_format": None}),
+        ("damage-summary?grade=7А", reports.get_damage_summary, {"grade": "7А", "damage_type": None, "status": None, "export_format": None}),
+        ("dashboard", reports.get_dashboard, {}),
+        ("damage-reports/statistics", damage_reports.get_damage_statistics, {}),
+        ("found-reports/statistics", found_reports.get_found_statistics, {}),
+        ("textbook-history", reports.get_textbook_history, {"textbook_id": 1, "cursor": None, "limit": 50, "export_format": None}),
+    ]
+
+
+async def count_queries(database_url: str, scale: int) -> dict:
+    """Создает базу заданного размера и считает запросы каждого отчета"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from app.core.database import Base, async_database_url
+    from app.core.query_stats import instrument_engine, track_queries
+    from app.services.report_cache import report_cache
+
+    engine = create_async_engine(async_database_url(database_url))
+    async with engine.begin() as connection:
+        # Временный PostgreSQL один на оба размера: таблицы пересоздаются
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    counts = {}
+    async with AsyncSession(engine, autoflush=False, expire_on_commit=False) as db:
+        await seed(db, scale)
+        instrument_engine(engine.sync_engine)
+
+        for name, endpoint, params in report_calls():
+            db.expunge_all()
+            # Считаются запросы расчета отчета, а не чтения из кэша
+            report_cache.clear()
+            with track_queries() as stats:
+                await endpoint(db=db, current_user=None, **params)
+            counts[name] = stats.count
+
+    await engine.dispose()
+    return counts
+
+
+@contextlib.contextmanager
+def database_urls(postgres: bool):
+    """URL баз для малого и большого размера"""
+    if postgres:
+        from local_postgres import temporary_postgres
+
+        with temporary_postgres() as database_url:
+            yield database_url, database_url
+    else:
+        directory = tempfile.mkdtemp()
+        yield (f"sqlite:///{os.path.join(directory, 'query_counts_small.db')}",
+               f"sqlite:///{os.path.join(directory, 'query_counts_large.db')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка количества SQL-запросов в отчетах")
+    parser.add_argument("--postgres", action="store_true", help="временный локальный PostgreSQL вместо SQLite")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    from app.models import user, student, textbook, transaction, damage_report, found_report, active_loan, scan_event
+
+    with database_urls(args.postgres) as (small_url, large_url):
+        small = asyncio.run(count_queries(small_url, scale=1))
+        large = asyncio.run(count_queries(large_url, scale=4))
+
+    failures = 0
+    for name in small:
+        constant = small[name] == large[name]
+        failures += not constant
+        print(f"{'✅' if constant else '❌'} {name}: {small[name]} -> {large[name]} запросов")
+
+    if failures:
+        print(f"\n❌ Отчетов с количеством запросов, зависящим от данных: {failures}")
+        sys.exit(1)
+
+    print("\n🎉 Количество запросов не зависит от объема данных")
+
+
+if __name__ == "__main__":
+    main()
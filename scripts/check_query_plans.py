@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Проверка планов горячих запросов
+
+Создает временную SQLite базу, применяет миграции, заполняет ее
+транзакциями (по умолчанию 100 000) и проверяет через EXPLAIN QUERY PLAN,
+что горячие запросы используют составные индексы.
+
+Запуск: python scripts/check_query_plans.py [--transactions 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+GRADES = [f"{number}{letter}" for number in range(5, 12) for letter in "АБВ"]
+
+
+def seed(engine, transactions_count: int):
+    """Заполняет базу учениками, учебниками, транзакциями и отчетами"""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.textbook import Textbook
+    from app.models.transaction import Transaction, TransactionType, TransactionStatus
+    from app.models.damage_report import DamageReport, DamageType, DamageStatus
+
+    random.seed(42)
+    students_count = 1500
+    textbooks_count = max(transactions_count // 10, 100)
+    start = datetime(2015, 9, 1)
+
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"username": "admin", "password_hash": "-", "role": UserRole.TEACHER,
+             "is_active": True, "student_id": None}
+        ] + [
+            {"username": f"student{i}", "password_hash": "-", "role": UserRole.STUDENT,
+             "is_active": True, "student_id": i}
+            for i in range(1, students_count + 1)
+        ])
+
+        conn.execute(Student.__table__.insert(), [
+            {"first_name": f"Имя{i}", "last_name": f"Фамилия{i}",
+             "grade": GRADES[i % len(GRADES)], "is_active": i % 20 != 0}
+            for i in range(1, students_count + 1)
+        ])
+
+        conn.execute(Textbook.__table__.insert(), [
+            {"qr_code": f"TEXTBOOK_{i:012d}", "subject": f"Предмет {i % 15}",
+             "title": f"Учебник {i % 60}", "is_active": True}
+            for i in range(1, textbooks_count + 1)
+        ])
+
+        # Каждый экземпляр по очереди выдается и возвращается
+        rows = []
+        for i in range(transactions_count):
+            textbook_id = i % textbooks_count + 1
+            cycle = i // textbooks_count
+            is_issue = cycle % 2 == 0
+            rows.append({
+                "textbook_id": textbook_id,
+                "student_id": random.randint(1, students_count),
+                "transaction_type": TransactionType.ISSUE if is_issue else TransactionType.RETURN,
+                "status": TransactionStatus.COMPLETED,
+                "issued_by": 1,
+                "issued_at": start + timedelta(days=cycle * 90, seconds=i),
+                # Возврат закрывает выдачу этого же экземпляра из предыдущего цикла
+                "issue_transaction_id": None if is_issue else i - textbooks_count + 1,
+            })
+        conn.execute(Transaction.__table__.insert(), rows)
+
+        conn.execute(DamageReport.__table__.insert(), [
+            {"textbook_id": random.randint(1, textbooks_count),
+             "damage_type": random.choice(list(DamageType)),
+             "description": "Порванная обложка",
+             "status": random.choice(list(DamageStatus)),
+             "reported_by": random.randint(2, students_count + 1),
+             "reported_at": start + timedelta(hours=i)}
+            for i in range(transactions_count // 20)
+        ])
+
+        conn.exec_driver_sql("ANALYZE")
+
+
+def hot_queries():
+    """Горячие запросы приложения и индексы, которые они должны использовать"""
+    from sqlalchemy import String, literal, select, tuple_, type_coerce
+    from app.models.user import User
+    from app.models.student import Student
+    from app.models.transaction import Transaction, TransactionType, TransactionStatus
+    from app.models.damage_report import DamageReport, DamageStatus
+    from app.models.active_loan import ActiveLoan
+
+    return [
+        (
+            "Активная выдача экземпляра",
+            select(Transaction).where(
+                Transaction.textbook_id == 42,
+                Transaction.transaction_type == TransactionType.ISSUE,
+                Transaction.status == TransactionStatus.COMPLETED
+            ),
+            "ix_transactions_textbook_type_status",
+        ),
+        (
+            "Выдачи ученика",
+            select(Transaction).where(
+                Transaction.student_id == 42,
+                Transaction.transaction_type == TransactionType.ISSUE,
+                Transaction.status == TransactionStatus.COMPLETED
+            ),
+            "ix_transactions_student_type_status",
+        ),
+        (
+            "Возврат по выдаче",
+            select(Transaction).where(Transaction.issue_transaction_id == 42),
+            "ix_transactions_issue_transaction_id",
+        ),
+        (
+            "Отчеты о повреждениях, ожидающие проверки",
+            select(DamageReport).where(
+                DamageReport.status == DamageStatus.PENDING,
+                DamageReport.reported_at <= datetime(2016, 1, 1)
+            ),
+            "ix_damage_reports_status_reported_at",
+        ),
+        (
+            "Отчеты ученика по экземпляру",
+            select(DamageReport).where(
+                DamageReport.textbook_id == 42,
+                DamageReport.reported_by == 42
+            ),
+            "ix_damage_reports_textbook_reported_by",
+        ),
+        (
+            "Активные ученики класса",
+            select(Student).where(Student.grade == "7А", Student.is_active == True),
+            "ix_students_grade_is_active",
+        ),
+        (
+            "Аккаунт ученика",
+            select(User).where(User.student_id == 42),
+            "ix_users_student_id",
+        ),
+        (
+            "Страница журнала транзакций после курсора",
+            select(Transaction).where(
+                tuple_(type_coerce(Transaction.created_at, String), Transaction.id)
+                > tuple_(literal("2024-09-01 08:00:00", String), 42)
+            ).order_by(Transaction.created_at, Transaction.id).limit(100),
+            "ix_transactions_created_at_id",
+        ),
+        (
+            "Учебники на руках у ученика",
+            select(ActiveLoan).where(ActiveLoan.student_id == 42),
+            "ix_active_loans_student_id",
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=100_000, help="Количество транзакций в базе")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "query_plans.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.chdir(ROOT)
+
+    from sqlalchemy import create_engine
+    from alembic import command
+    from alembic.config import Config
+    from app.core.database import Base
+    from app.models import user, student, textbook, transaction, damage_report, found_report, active_loan, scan_event
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+
+    print("📋 Создание схемы и применение миграций...")
+    Base.metadata.create_all(bind=engine)
+    command.upgrade(Config(os.path.join(ROOT, "alembic.ini")), "head")
+
+    print(f"🌱 Заполнение базы ({args.transactions} транзакций)...")
+    seed(engine, args.transactions)
+
+    failures = 0
+    with engine.connect() as conn:
+        for description, statement, expected_index in hot_queries():
+            sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+            uses_index = any(expected_index in detail for detail in plan)
+            failures += not uses_index
+
+            print(f"{'✅' if uses_index else '❌'} {description}: {expected_index}")
+            for detail in plan:
+                print(f"     {detail}")
+
+    if failures:
+        print(f"\n❌ Запросов без ожидаемого индекса: {failures}")
+        sys.exit(1)
+
+    print("\n🎉 Все горячие запросы используют индексы")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Временный локальный PostgreSQL для проверок и бенчмарков без Docker
+
+Находит initdb и pg_ctl (каталог POSTGRES_BIN_DIR или PATH), создает кластер
+во временной папке и запускает сервер только на unix-сокете в этой же папке,
+поэтому он не конфликтует с установленным PostgreSQL и не слушает сеть.
+После выхода из контекста сервер останавливается, папка удаляется.
+initdb не запускается от root - проверки нужно запускать от обычного пользователя.
+
+Использование в скриптах:
+    with temporary_postgres() as database_url:
+        ...
+
+Запуск вручную (сервер работает до Ctrl+C): python scripts/local_postgres.py
+"""
+
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Iterator
+
+
+def postgres_binary(name: str) -> str:
+    """Путь к утилите PostgreSQL из POSTGRES_BIN_DIR или PATH"""
+    bin_dir = os.environ.get("POSTGRES_BIN_DIR")
+    path = os.path.join(bin_dir, name) if bin_dir else shutil.which(name)
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"{name} не найден: установите PostgreSQL или укажите POSTGRES_BIN_DIR")
+    return path
+
+
+@contextlib.contextmanager
+def temporary_postgres() -> Iterator[str]:
+    """Запускает временный кластер и возвращает его DATABASE_URL (синхронный драйвер)"""
+    directory = tempfile.mkdtemp(prefix="textbooks_pg_")
+    data_dir = os.path.join(directory, "data")
+    log_file = os.path.join(directory, "postgres.log")
+    pg_ctl = postgres_binary("pg_ctl")
+
+    try:
+        subprocess.run(
+            [postgres_binary("initdb"), "-D", data_dir, "-U", "postgres", "--auth=trust",
+             "--encoding=UTF8", "--locale=C", "--no-sync"],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        subprocess.run(
+            [pg_ctl, "-D", data_dir, "-l", log_file, "-w",
+             "-o", f"-k {directory} -c listen_addresses=''", "start"],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        try:
+            yield f"postgresql://postgres@/postgres?host={directory}"
+        finally:
+            subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "-w", "stop"],
+                           check=False, stdout=subprocess.DEVNULL)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    import time
+
+    with temporary_postgres() as database_url:
+        print(f"🐘 PostgreSQL запущен: DATABASE_URL={database_url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n🛑 Остановка")
+
+
+if __name__ == "__main__":
+    main()
@@ -164,34 +164,20 @@ function showDashboard() {
 // Загрузка данных
 async function loadDashboardData() {
     try {
-        // Загружаем статистику
-        const [studentsResponse, textbooksResponse, transactionsResponse, reportsResponse] = await Promise.all([
-            fetch(`${API_BASE}/students`, { headers: { 'Authorization': `Bearer ${authToken}` } }),
-            fetch(`${API_BASE}/textbooks`, { headers: { 'Authorization': `Bearer ${authToken}` } }),
-            fetch(`${API_BASE}/transactions`, { headers: { 'Authorization': `Bearer ${authToken}` } }),
-            fetch(`${API_BASE}/damage-reports`, { headers: { 'Authorization': `Bearer ${authToken}` } })
-        ]);
-
-        if (studentsResponse.ok) {
-            const students = await studentsResponse.json();
-            document.getElementById('totalStudents').textContent = students.length;
-        }
-
-        if (textbooksResponse.ok) {
-            const textbooks = await textbooksResponse.json();
-            document.getElementById('totalTextbooks').textContent = textbooks.length;
-        }
-
-        if (transactionsResponse.ok) {
-            const transactions = await transactionsResponse.json();
-            const activeTransactions = transactions.filter(t => t.status === 'completed' && t.transaction_type === 'issue');
-            document.getElementById('activeTransactions').textContent = activeTransactions.length;
-        }
+        // Все счетчики приходят одним агрегированным ответом
+        const response = await fetch(`${API_BASE}/reports/dashboard`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
 
-        if (reportsResponse.ok) {
-            const reports = await reportsResponse.json();
-            const pendingReports = reports.filter(r => r.status === 'pending');
-            document.getElementById('pendingReports').textContent = pendingReports.length;
+        if (response.ok) {
+            const counts = await response.json();
+            document.getElementById('totalStudents').textContent = counts.active_students;
+            document.getElementById('totalTextbooks').textContent = counts.active_textbooks;
+            document.getElementById('activeTransactions').textContent = counts.on_loan;
+            document.getElementById('availableTextbooks').textContent = counts.available;
+            document.getElementById('pendingReports').textContent = counts.pending_damage;
+            document.getElementById('openFoundReports').textContent = counts.open_found;
+            document.getElementById('overdueLoans').textContent = counts.overdue_loans;
         }
     } catch (error) {
         console.error('Ошибка загрузки данных дашборда:', error);
@@ -328,8 +314,8 @@ function renderTransactionsTable(transactions) {
         row.innerHTML = `
             <td>${transaction.id}</td>
             <td>${transaction.transaction_type === 'issue' ? 'Выдача' : 'Возврат'}</td>
-            <td>${transaction.student?.full_name || 'Неизвестно'}</td>
-            <td>${transaction.textbook?.title || 'Неизвестно'}</td>
+            <td>${transaction.student_name || 'Неизвестно'}</td>
+            <td>${transaction.textbook_title || 'Неизвестно'}</td>
             <td>${new Date(transaction.issued_at).toLocaleDateString()}</td>
             <td>${transaction.status === 'completed' ? 'Завершена' : 'В процессе'}</td>
             <td>